@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""Many independent games advanced in lockstep with NumPy
+
+A BatchEngine holds N matrices as one array of line bitmasks, laid out as
+in engine.Matrix (column x is bit x+2, two wall bits on each side), and
+applies one placement per game and per step: the current piece, turned to
+a given orientation and moved to a given column at the spawn line, is hard
+dropped. Collision tests, line clears and scoring from Stats.piece_locked
+are array operations across the whole batch, and each game draws its
+pieces from the same 7-bag as an Engine with the same seed.
+
+A placement that does not fit at the spawn line ends the game, as does a
+next piece that can not spawn. Placements are moved then dropped, never
+spun, so they score no T-spin; hold is not simulated.
+"""
+
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError(
+"""terminis.batch requires NumPy.
+You can install it with:
+pip install --user terminis[batch]"""
+    )
+
+from .engine import Engine, Matrix, Stats
+
+
+# Line masks of each tetromino and orientation, indexed by line offset:
+# PIECE_MASKS[p, o, dy+2] for dy from -2 to 2
+DYS = range(-2, 3)
+PIECE_MASKS = np.zeros((len(Engine.TETROMINOES), 4, len(DYS)), dtype=np.int64)
+for p, tetromino_class in enumerate(Engine.TETROMINOES):
+    for o, masks in enumerate(tetromino_class.MASKS):
+        for dy, mask in masks:
+            PIECE_MASKS[p, o, dy+2] = mask
+LINE_SCORES = np.array([scores[""] for scores in Stats.SCORES], dtype=np.int64)
+
+
+class BatchEngine:
+    """N games placing pieces in lockstep
+
+    Pieces are indexes into Engine.TETROMINOES. Per game arrays: lines
+    (N x nb_lines bitmasks), pieces (current piece), score, level, goal,
+    combo, lines_cleared and game_over.
+    """
+
+    SPAWN_Y = 0
+    QUEUE_BAGS = 16
+
+    def __init__(self, n, level=1, seeds=None, nb_cols=Matrix.NB_COLS, nb_lines=Matrix.NB_LINES):
+        if nb_cols + 4 > 63:
+            raise ValueError("a batch matrix can not be wider than 59 columns")
+        self.n = n
+        self.nb_cols = nb_cols
+        self.nb_lines = nb_lines
+        self.empty_line = 0b11 | 0b11 << nb_cols+2
+        self.full_line = (1 << nb_cols+4) - 1
+        self.lines = np.full((n, nb_lines), self.empty_line, dtype=np.int64)
+        if seeds is None:
+            seeds = [random.getrandbits(64) for i in range(n)]
+        self.seeds = list(seeds)
+        self.randoms = [random.Random(seed) for seed in self.seeds]
+        self.queue = np.zeros((n, 0), dtype=np.int64)
+        self.queue_index = 0
+        self.pieces = self.pop_pieces()
+        level = max(1, level)
+        self.level = np.full(n, level, dtype=np.int64)
+        self.goal = np.full(n, 5*level, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.combo = np.full(n, -1, dtype=np.int64)
+        self.lines_cleared = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+
+    def pop_pieces(self):
+        """Next piece of every game, drawn as Engine.random_piece does"""
+        if self.queue_index == self.queue.shape[1]:
+            queue = []
+            for rng in self.randoms:
+                pieces = []
+                for bag in range(self.QUEUE_BAGS):
+                    random_bag = list(range(len(Engine.TETROMINOES)))
+                    rng.shuffle(random_bag)
+                    pieces.extend(reversed(random_bag))
+                queue.append(pieces)
+            self.queue = np.array(queue, dtype=np.int64).reshape(self.n, -1)
+            self.queue_index = 0
+        self.queue_index += 1
+        return self.queue[:, self.queue_index-1]
+
+    def piece_masks(self, pieces, orientations, xs):
+        return PIECE_MASKS[pieces, orientations] << np.clip(xs, 0, self.nb_cols-1)[:, None]
+
+    def fits(self, pieces, orientations, xs, ys):
+        """Whether each piece is free at its position, as an N bool array"""
+        masks = self.piece_masks(pieces, orientations, xs)
+        games = np.arange(self.n)
+        free = (xs >= 0) & (xs < self.nb_cols)
+        for dy in DYS:
+            rows = ys + dy
+            lines = self.lines[games, np.clip(rows, 0, self.nb_lines-1)]
+            lines = np.where(rows < 0, self.empty_line, lines)
+            lines = np.where(rows >= self.nb_lines, self.full_line, lines)
+            free &= lines & masks[:, dy+2] == 0
+        return free
+
+    def collisions(self, pieces, orientations, xs):
+        """Collisions of each piece on lines SPAWN_Y to nb_lines, as an N x (nb_lines-SPAWN_Y+1) bool array"""
+        masks = self.piece_masks(pieces, orientations, xs)
+        # Pad with free lines above the matrix and with floor lines below,
+        # so that lines y+dy of all y are a slice
+        padded = np.concatenate((
+            np.full((self.n, 2), self.empty_line, dtype=np.int64),
+            self.lines,
+            np.full((self.n, 3), self.full_line, dtype=np.int64)
+        ), axis=1)
+        nb_ys = self.nb_lines - self.SPAWN_Y + 1
+        collisions = np.zeros((self.n, nb_ys), dtype=bool)
+        for dy in DYS:
+            begin = self.SPAWN_Y + dy + 2
+            collisions |= padded[:, begin:begin+nb_ys] & masks[:, dy+2, None] != 0
+        collisions[(xs < 0) | (xs >= self.nb_cols)] = True
+        return collisions
+
+    def step(self, orientations, xs):
+        """Hard drop the current piece of each game at given orientation and column
+
+        Returns the number of lines cleared by each game.
+        """
+        orientations = np.asarray(orientations, dtype=np.int64) % 4
+        xs = np.asarray(xs, dtype=np.int64)
+        playing = ~self.game_over
+        collisions = self.collisions(self.pieces, orientations, xs)
+
+        # Block out: the piece does not fit at the spawn line
+        blocked = playing & collisions[:, 0]
+        self.game_over |= blocked
+        playing &= ~blocked
+
+        distances = collisions[:, 1:].argmax(axis=1)
+        self.score += np.where(playing, 2*distances, 0)
+        ys = self.SPAWN_Y + distances
+
+        masks = self.piece_masks(self.pieces, orientations, xs)
+        # Lock out: a mino is locked above the matrix
+        locked_out = np.zeros(self.n, dtype=bool)
+        for dy in DYS:
+            locked_out |= (masks[:, dy+2] != 0) & (ys+dy < 0)
+        locked_out &= playing
+        self.game_over |= locked_out
+        playing &= ~locked_out
+        for dy in DYS:
+            games = np.flatnonzero(playing & (masks[:, dy+2] != 0))
+            self.lines[games, ys[games]+dy] |= masks[games, dy+2]
+
+        full = (self.lines == self.full_line) & playing[:, None]
+        nb_lines = full.sum(axis=1)
+        if nb_lines.any():
+            # Stable sort moves full lines to the top, keeping the others in order
+            order = np.argsort(~full, axis=1, kind="stable")
+            self.lines = np.take_along_axis(self.lines, order, axis=1)
+            self.lines[np.arange(self.nb_lines)[None, :] < nb_lines[:, None]] = self.empty_line
+        self.score_lines(nb_lines, playing)
+
+        self.pieces = self.pop_pieces()
+        spawn_xs = np.full(self.n, self.nb_cols//2 - 1, dtype=np.int64)
+        spawn_ys = np.full(self.n, self.SPAWN_Y, dtype=np.int64)
+        self.game_over |= ~self.fits(self.pieces, np.zeros(self.n, dtype=np.int64), spawn_xs, spawn_ys)
+        return nb_lines
+
+    def score_lines(self, nb_lines, playing):
+        """Stats.piece_locked without T-spins, for playing games"""
+        cleared = playing & (nb_lines > 0)
+        self.combo = np.where(cleared, self.combo+1, np.where(playing, -1, self.combo))
+        ds = LINE_SCORES[nb_lines] * playing
+        self.lines_cleared += nb_lines
+        self.goal -= ds
+        self.score += ds * 100 * self.level
+        combo = playing & (self.combo >= 1)
+        self.score += np.where(combo, np.where(nb_lines == 1, 20, 50) * self.combo * self.level, 0)
+        new_level = playing & (self.goal <= 0)
+        self.level += new_level
+        self.goal += np.where(new_level, 5*self.level, 0)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""terminis-bench: many non-interactive games on every core
+
+Games are either driven by the autoplay bot, each with its own seed, or
+replays of recorded games, and run in a process pool. Their score, lines,
+level reached, pieces per second and lock outcomes are then aggregated.
+"""
+
+import sys
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import Engine, Stats
+from .bot import Bot
+from . import replay
+
+
+HELP_MSG = """terminis-bench [options] [FILE...]
+
+Play games with the autoplay bot, or replay the recorded FILEs,
+in parallel, and report aggregated results
+
+  --help\t-h\tshow command usage (this message)
+  --games=n\t\tnumber of bot games (default 100)
+  --pieces=n\t\tstop bot games after n pieces (default 1000)
+  --level=n\t\tstart bot games at level n (default 1)
+  --seed=n\t\tseed of the first bot game, incremented for the next ones (default 0)
+  --jobs=n\t\tnumber of worker processes (default: number of CPUs)"""
+
+
+def outcome_name(nb_lines, t_spin):
+    return " ".join(name for name in (t_spin, Stats.SCORES[nb_lines]["name"]) if name)
+
+
+class Result:
+    """Outcome of one game"""
+
+    def __init__(self, name):
+        self.name = name
+        self.error = None
+        self.score = 0
+        self.lines = 0
+        self.level = 0
+        self.pieces = 0
+        self.seconds = 0
+        self.outcomes = Counter()
+
+    def count_locks(self, events):
+        for event in events:
+            if event[0] == "lock":
+                self.pieces += 1
+                nb_lines, t_spin = event[1:]
+                if nb_lines or t_spin:
+                    self.outcomes[outcome_name(nb_lines, t_spin)] += 1
+
+    def finish(self, engine, start_time):
+        self.seconds = time.time() - start_time
+        self.score = engine.stats.score
+        self.lines = engine.stats.lines_cleared
+        self.level = engine.stats.level
+        return self
+
+
+def play_bot_game(args):
+    seed, level, max_pieces = args
+    result = Result("seed %d" % seed)
+    start_time = time.time()
+    engine = Engine(level=level, seed=seed)
+    player = Bot()
+    while not engine.game_over and result.pieces < max_pieces:
+        for action in player.plan(engine):
+            result.count_locks(engine.step(action))
+    return result.finish(engine, start_time)
+
+
+def play_replay(path):
+    result = Result(path)
+    start_time = time.time()
+    try:
+        with open(path, "rb") as f:
+            engine = replay.replay(f, result.count_locks)
+    except (IOError, replay.ReplayError) as e:
+        result.error = str(e)
+        return result
+    return result.finish(engine, start_time)
+
+
+def percentiles(values):
+    values = sorted(values)
+    return "min %s  median %s  p90 %s  max %s" % tuple(
+        "{:n}".format(values[min(len(values)-1, int(len(values)*p))])
+        for p in (0, 0.5, 0.9, 1)
+    )
+
+
+def report(results, wall_time):
+    failed = [result for result in results if result.error]
+    results = [result for result in results if not result.error]
+    for result in failed:
+        print("FAILED\t%s: %s" % (result.name, result.error))
+    print("GAMES\t%d" % len(results))
+    if not results:
+        return
+    pieces = sum(result.pieces for result in results)
+    print("SCORE\t%s" % percentiles([result.score for result in results]))
+    print("LINES\t%s" % percentiles([result.lines for result in results]))
+    print("LEVEL\t%s" % percentiles([result.level for result in results]))
+    print("PIECES\t%d" % pieces)
+    print("PIECES/S\t%.0f per process  %.0f overall" % (
+        pieces / max(sum(result.seconds for result in results), 1e-9),
+        pieces / max(wall_time, 1e-9)
+    ))
+    outcomes = Counter()
+    for result in results:
+        outcomes.update(result.outcomes)
+    for name, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print("%s\t%d (%.2f%% of pieces)" % (name, count, 100.0*count/pieces))
+
+
+def parse_int(name, default):
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + "="):
+            try:
+                return int(arg[len(name)+1:])
+            except ValueError:
+                sys.exit(HELP_MSG)
+    return default
+
+
+def main():
+    if "--help" in sys.argv[1:] or "-h" in sys.argv[1:]:
+        print(HELP_MSG)
+        return
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith("-")]
+    jobs = parse_int("--jobs", os.cpu_count())
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if paths:
+            results = list(executor.map(play_replay, paths, chunksize=16))
+        else:
+            games = parse_int("--games", 100)
+            seed = parse_int("--seed", 0)
+            args = [
+                (seed+game, parse_int("--level", 1), parse_int("--pieces", 1000))
+                for game in range(games)
+            ]
+            results = list(executor.map(play_bot_game, args))
+    report(results, time.time() - start_time)
+    if any(result.error for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""Autoplay bot driving an Engine with the actions a human uses
+
+For the current piece, and for the piece that hold would bring, the bot
+searches every placement reachable with moves, rotations using the SRS
+kicks of the Tetromino tables and drops, so that tucks and T-spins are
+found. Drops go straight to the surface with Matrix.drop_distance, and
+placements locking the same cells are only evaluated once per T-spin kind.
+Each placement is scored by a weighted sum of board features.
+"""
+
+import time
+
+from .engine import Rotation, Stats, T
+
+
+try:
+    popcount = int.bit_count
+except AttributeError: # Python < 3.10
+    def popcount(n):
+        return bin(n).count("1")
+
+
+class Timeout(Exception):
+    """Raised once a deadline has passed, by Bot.placements with the placements found until then"""
+
+
+class Bot:
+    # States searched by placements between checks of its deadline
+    DEADLINE_CHECKS = 32
+    # Weights of lines score (Stats.SCORES units, T-spins included),
+    # aggregate column height, holes and bumpiness after a placement
+    WEIGHTS = {
+        "lines": 0.76,
+        "height": -0.51,
+        "holes": -0.36,
+        "bumpiness": -0.18
+    }
+    MOVES = (
+        ("MOVE LEFT", -1),
+        ("MOVE RIGHT", 1)
+    )
+    ROTATIONS = (
+        ("ROTATE CLOCKWISE", Rotation.CLOCKWISE),
+        ("ROTATE COUNTER", Rotation.COUNTERCLOCKWISE)
+    )
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+
+    def plan(self, engine, deadline=None):
+        """Actions placing the current piece, or the held one, at best
+
+        If the time.perf_counter deadline is given and passes, the best of
+        the placements found until then is played.
+        """
+        matrix = engine.matrix
+        piece = matrix.piece
+        best = self.best_placement(
+            matrix, piece.__class__, piece.position.x, piece.position.y, piece.orientation, piece.rotation_point_5_used,
+            deadline
+        )
+        if piece.hold_enabled:
+            held_piece = engine.hold_piece or engine.next_piece
+            x = matrix.piece_position.x
+            y = matrix.piece_position.y + 1
+            if matrix.is_free_piece(x, y, held_piece.MASKS[0]):
+                held_best = self.best_placement(matrix, held_piece.__class__, x, y, 0, False, deadline)
+                if held_best and (not best or held_best[0] > best[0]):
+                    return ["HOLD"] + held_best[1]
+        if best:
+            return best[1]
+        return ["HARD DROP"]
+
+    def best_placement(self, matrix, tetromino_class, x, y, orientation, rotation_point_5_used, deadline=None):
+        """(value, actions) of the best placement found before deadline, None if there is none"""
+        best = None
+        evaluated = {}
+        try:
+            placements = self.placements(matrix, tetromino_class, x, y, orientation, rotation_point_5_used, deadline)
+        except Timeout as timeout:
+            placements = timeout.args[0]
+        for state, depth in placements.items():
+            x, y, orientation, rotated_last, point_5 = state
+            t_spin = self.t_spin(matrix, tetromino_class, x, y, orientation, rotated_last, point_5)
+            key = (
+                tuple((y+dy, mask << x) for dy, mask in tetromino_class.MASKS[orientation]),
+                t_spin
+            )
+            if key not in evaluated:
+                evaluated[key] = self.evaluate(matrix, key[0], t_spin)
+            value = evaluated[key]
+            if value is not None and (best is None or (value, -depth) > (best[0], -best[2])):
+                best = (value, state, depth)
+        if best is None:
+            return None
+        value, state, depth = best
+        return (value, self.actions(state))
+
+    def actions(self, state):
+        """Actions bringing the piece to state, found by the last placements search, and locking it"""
+        actions = []
+        while state is not None:
+            state, state_actions = self.parents[state]
+            actions[:0] = state_actions
+        # Trailing drops are done at once by the hard drop locking the piece
+        while actions and actions[-1] == "SOFT DROP":
+            actions.pop()
+        return actions + ["HARD DROP"]
+
+    def placements(self, matrix, tetromino_class, x, y, orientation, rotation_point_5_used, deadline=None):
+        """Breadth-first search of the lockable states reachable from a start state
+
+        States are (x, y, orientation, rotated_last, rotation_point_5_used),
+        the last two only telling T-spins apart. Returns a dict mapping each
+        state where the piece rests on the surface to its search depth, and
+        leaves in self.parents the previous state and actions of each state.
+        Raises Timeout, with the placements found so far, if the
+        time.perf_counter deadline is given and passed.
+        """
+        is_t = tetromino_class is T
+        start = (x, y, orientation, False, rotation_point_5_used and is_t)
+        self.parents = {start: (None, ())}
+        queue = [(start, 0)]
+        placements = {}
+        for i, (state, depth) in enumerate(queue):
+            if deadline and i % self.DEADLINE_CHECKS == 0 and time.perf_counter() > deadline:
+                raise Timeout(placements)
+            x, y, orientation, rotated_last, point_5 = state
+            masks = tetromino_class.MASKS[orientation]
+            next_states = []
+            distance = matrix.drop_distance(x, y, tetromino_class.BOTTOMS[orientation], masks)
+            if distance:
+                next_states.append(((x, y+distance, orientation, False, point_5), ("SOFT DROP",) * distance))
+            else:
+                placements[state] = depth
+            for action, dx in self.MOVES:
+                if matrix.is_free_piece(x+dx, y, masks):
+                    next_states.append(((x+dx, y, orientation, False, point_5), (action,)))
+            for action, direction in self.ROTATIONS:
+                if not tetromino_class.KICKS:
+                    break
+                rotated_orientation = (orientation+direction) % 4
+                rotated_masks = tetromino_class.MASKS[rotated_orientation]
+                for rotation_point, (dx, dy) in enumerate(tetromino_class.KICKS[orientation][direction], start=1):
+                    if matrix.is_free_piece(x+dx, y+dy, rotated_masks):
+                        next_states.append((
+                            (x+dx, y+dy, rotated_orientation, is_t, point_5 or (is_t and rotation_point == 5)),
+                            (action,)
+                        ))
+                        break
+            for next_state, actions in next_states:
+                if next_state not in self.parents:
+                    self.parents[next_state] = (state, actions)
+                    queue.append((next_state, depth+1))
+        return placements
+
+    def t_spin(self, matrix, tetromino_class, x, y, orientation, rotated_last, rotation_point_5_used):
+        """T.t_spin of a T locked in this state"""
+        if tetromino_class is not T:
+            return ""
+        return T.t_spin_at(matrix, x, y, orientation, rotated_last, rotation_point_5_used)
+
+    def evaluate(self, matrix, minoes_masks, t_spin):
+        """Weighted features of the matrix once the piece is locked, None if it locks out"""
+        lines = list(matrix.lines)
+        for y, mask in minoes_masks:
+            if y < 0:
+                return None
+            lines[y] |= mask
+        remaining = [line for line in lines if line != matrix.full_line]
+        nb_lines = len(lines) - len(remaining)
+
+        cols_mask = (1 << matrix.nb_cols) - 1
+        heights = [0 for x in range(matrix.nb_cols)]
+        covered = 0
+        holes = 0
+        top = len(remaining)
+        for y, line in enumerate(remaining):
+            cells = line >> 2 & cols_mask
+            uncovered = cells & ~covered
+            while uncovered:
+                lowest = uncovered & -uncovered
+                heights[lowest.bit_length()-1] = top - y
+                uncovered ^= lowest
+            holes += popcount(~cells & covered & cols_mask)
+            covered |= cells
+
+        scores = Stats.SCORES[nb_lines]
+        return (
+            self.weights["lines"] * scores.get(t_spin, scores[""])
+            + self.weights["height"] * sum(heights)
+            + self.weights["holes"] * holes
+            + self.weights["bumpiness"] * sum(abs(a-b) for a, b in zip(heights, heights[1:]))
+        )
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+"""Live games streamed to read-only viewers
+
+terminis --broadcast=ADDRESS, then terminis --watch=ADDRESS
+
+ADDRESS is HOST:PORT for TCP or the path of a Unix socket. The display
+state of a game, its cells and fields, is encoded once per frame: the first
+message of each viewer is a snapshot of the whole state, the next ones only
+the cells and fields which changed. Viewers are never waited for: sockets
+are non-blocking, and a viewer falling too far behind skips frames, then
+catches up with a new snapshot.
+
+A message is a HEADER (size of the rest, kind, number of cells), then the
+cells, as bytes for a snapshot or (index, code) CELL pairs for a delta,
+then the fields as JSON.
+"""
+
+import sys
+import os
+import json
+import stat
+import socket
+import struct
+from collections import deque
+
+from .engine import Engine
+
+
+SNAPSHOT = 0
+DELTA = 1
+HEADER = struct.Struct("<IBH")
+CELL = struct.Struct("<HB")
+
+# Codes of cells: 1 + index of the tetromino class in Engine.TETROMINOES,
+# or 0 if empty, combined with these flags
+ACTIVE = 8
+GHOST = 16
+LOCKING = 32
+CODES = dict((tetromino_class, code) for code, tetromino_class in enumerate(Engine.TETROMINOES, start=1))
+
+
+def view(engine):
+    """Display state of engine: cells codes line by line, and fields"""
+    matrix = engine.matrix
+    nb_cols = matrix.nb_cols
+    cells = bytearray(nb_cols * matrix.nb_lines)
+    for y, line in enumerate(matrix.cells):
+        for x, tetromino_class in enumerate(line):
+            if tetromino_class is not None:
+                cells[y*nb_cols + x] = CODES[tetromino_class]
+    piece = matrix.piece
+    if piece and not engine.game_over:
+        code = CODES[piece.__class__]
+        ghost_y = piece.position.y + piece.drop_distance()
+        for mino_position in piece.minoes_positions:
+            y = ghost_y + mino_position.y
+            if y >= 0:
+                cells[y*nb_cols + piece.position.x + mino_position.x] = code | GHOST
+        code |= ACTIVE
+        if "lock" in engine.scheduler:
+            code |= LOCKING
+        for mino_position in piece.minoes_positions:
+            y = piece.position.y + mino_position.y
+            if y >= 0:
+                cells[y*nb_cols + piece.position.x + mino_position.x] = code
+    stats = engine.stats
+    fields = {
+        "cols": nb_cols,
+        "lines": matrix.nb_lines,
+        "hold": CODES[engine.hold_piece.__class__] if engine.hold_piece else 0,
+        "next": CODES[engine.next_piece.__class__],
+        "score": stats.score,
+        "high": stats.high_score,
+        "time": int(engine.time),
+        "level": stats.level,
+        "goal": stats.goal,
+        "cleared": stats.lines_cleared,
+        "strings": stats.strings,
+        "paused": engine.paused,
+        "over": engine.game_over
+    }
+    return cells, fields
+
+
+def encode(kind, cells, fields):
+    body = json.dumps(fields, separators=(",", ":")).encode("utf-8")
+    nb_cells = len(cells)
+    if kind == SNAPSHOT:
+        cells = bytes(cells)
+    else:
+        cells = b"".join(CELL.pack(i, code) for i, code in cells)
+    return HEADER.pack(HEADER.size - 4 + len(cells) + len(body), kind, nb_cells) + cells + body
+
+
+def socket_address(address):
+    """(family, address) of HOST:PORT or of a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        host = host.strip("[]") or "127.0.0.1"
+        return (socket.AF_INET6 if ":" in host else socket.AF_INET), (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class Viewer:
+    def __init__(self, sock):
+        self.sock = sock
+        self.messages = deque()
+        self.offset = 0
+        self.pending = 0
+        self.needs_snapshot = True
+
+    def flush(self):
+        """Send what the socket accepts without blocking, False if it is closed"""
+        while self.messages:
+            message = self.messages[0]
+            try:
+                sent = self.sock.send(message[self.offset:])
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            self.offset += sent
+            self.pending -= sent
+            if self.offset < len(message):
+                return True
+            self.messages.popleft()
+            self.offset = 0
+        return True
+
+
+def file_identity(info):
+    # Inode numbers are reused as soon as a file is removed
+    return info.st_dev, info.st_ino, info.st_ctime_ns
+
+
+def is_socket(path, identity=None):
+    """Whether path is a Unix socket, and the one of identity if given"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and (identity is None or file_identity(info) == identity)
+
+
+class Broadcaster:
+    """Listen for viewers and send them each frame of a game"""
+
+    # Bytes queued for a viewer past which it skips frames
+    MAX_PENDING = 1 << 16
+
+    def __init__(self, address):
+        family, self.address = socket_address(address)
+        if family == socket.AF_UNIX and os.path.lexists(self.address):
+            # A socket left by a game that did not close it is reused, but
+            # any other file is not ours to delete
+            if not is_socket(self.address):
+                raise FileExistsError("%s exists and is not a socket" % self.address)
+            os.remove(self.address)
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        if family == socket.AF_UNIX:
+            self.identity = file_identity(os.stat(self.address))
+        self.listener.listen(8)
+        self.listener.setblocking(False)
+        self.family = family
+        self.viewers = []
+        self.cells = None
+        self.fields = None
+
+    def accept(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            self.viewers.append(Viewer(sock))
+
+    def poll(self, engine):
+        """Accept new viewers and send them the game, and what slow viewers still wait for, between frames"""
+        self.accept()
+        if any(viewer.needs_snapshot or viewer.messages for viewer in self.viewers):
+            self.send(engine)
+
+    def send(self, engine):
+        self.accept()
+        if not self.viewers:
+            self.cells = None
+            return
+        cells, fields = view(engine)
+        delta = snapshot = None
+        for viewer in self.viewers:
+            if viewer.needs_snapshot:
+                if snapshot is None:
+                    snapshot = encode(SNAPSHOT, cells, fields)
+                message = snapshot
+                viewer.needs_snapshot = False
+            else:
+                if delta is None:
+                    delta = encode(
+                        DELTA,
+                        [(i, code) for i, (code, previous) in enumerate(zip(cells, self.cells)) if code != previous],
+                        dict((name, value) for name, value in fields.items() if self.fields.get(name) != value)
+                    )
+                message = delta
+            viewer.messages.append(message)
+            viewer.pending += len(message)
+        self.cells = cells
+        self.fields = fields
+
+        viewers = []
+        for viewer in self.viewers:
+            if not viewer.flush():
+                viewer.sock.close()
+                continue
+            if viewer.pending > self.MAX_PENDING:
+                # Skip queued frames, but the one partly sent, and start
+                # again from a snapshot
+                while len(viewer.messages) > (1 if viewer.offset else 0):
+                    viewer.pending -= len(viewer.messages.pop())
+                viewer.needs_snapshot = True
+            viewers.append(viewer)
+        self.viewers = viewers
+
+    def close(self):
+        for viewer in self.viewers:
+            viewer.sock.close()
+        self.listener.close()
+        # Remove the socket file unless it was replaced since it was bound
+        if self.family == socket.AF_UNIX and is_socket(self.address, self.identity):
+            os.remove(self.address)
+
+
+class Decoder:
+    """Display state rebuilt from the messages of a Broadcaster"""
+
+    def __init__(self):
+        self.buffer = b""
+        self.cells = None
+        self.fields = {}
+
+    def feed(self, data):
+        """Apply the complete messages of data, returning how many there were"""
+        self.buffer += data
+        nb_messages = 0
+        while len(self.buffer) >= HEADER.size:
+            length, kind, nb_cells = HEADER.unpack_from(self.buffer)
+            if len(self.buffer) < 4 + length:
+                break
+            message = self.buffer[HEADER.size:4+length]
+            self.buffer = self.buffer[4+length:]
+            if kind == SNAPSHOT:
+                self.cells = bytearray(message[:nb_cells])
+                self.fields = json.loads(message[nb_cells:].decode("utf-8"))
+            elif self.cells is not None:
+                end = nb_cells * CELL.size
+                for i, code in CELL.iter_unpack(message[:end]):
+                    self.cells[i] = code
+                self.fields.update(json.loads(message[end:].decode("utf-8")))
+            nb_messages += 1
+        return nb_messages
+
+
+def watch(address):
+    from .server import Display
+
+    family, address = socket_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sys.exit("Could not watch %s: %s" % (address, e))
+    out = sys.stdout.buffer
+    out.write(b"\x1b[?25l\x1b[2J")
+    decoder = Decoder()
+    display = None
+    try:
+        while True:
+            data = sock.recv(1 << 16)
+            if not data:
+                break
+            # Only draw the last state of what was received at once
+            if decoder.feed(data) and decoder.cells is not None:
+                if display is None:
+                    display = Display(
+                        decoder.fields["cols"], decoder.fields["lines"],
+                        "WATCHING", ["CTRL-C  QUIT"]
+                    )
+                out.write(display.draw(decoder.cells, decoder.fields))
+                out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        if display:
+            out.write(b"\x1b[%d;1H" % (display.height+1))
+        out.write(b"\x1b[0m\x1b[?25h\n")
+        out.flush()
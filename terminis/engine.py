@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+
+"""Terminis rules, free of curses and of wall-clock time
+
+An Engine is driven by explicit actions and time deltas through step(), and
+reports what happened as a list of events, so that it can be drawn by any
+frontend or simulated as fast as the CPU allows.
+"""
+
+import math
+import random
+import sched
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%02d:%02d:%02d" % (hours, minutes, seconds)
+
+
+def summary(game):
+    return (
+        "SCORE\t{:n}\n".format(game.stats.score) +
+        "HIGH\t{:n}\n".format(game.stats.high_score) +
+        "TIME\t%s\n" % format_time(game.time) +
+        "LEVEL\t%d\n" % game.stats.level +
+        "LINES\t%d" % game.stats.lines_cleared
+    )
+
+
+class Rotation:
+    CLOCKWISE = 1
+    COUNTERCLOCKWISE = -1
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __add__(self, other):
+        return Point(self.x+other.x, self.y+other.y)
+
+
+class Movement:
+    LEFT  = Point(-1, 0)
+    RIGHT = Point(1, 0)
+    DOWN  = Point(0, 1)
+
+
+def line_masks(minoes_positions):
+    """Group minoes by line into (dy, mask) pairs, dx being bit dx+2"""
+    masks = {}
+    for mino_position in minoes_positions:
+        masks[mino_position.y] = masks.get(mino_position.y, 0) | 1 << mino_position.x+2
+    return tuple(sorted(masks.items()))
+
+
+class Scheduler(sched.scheduler, dict):
+    """Named jobs on the clock timefunc
+
+    Repeated jobs are re-armed from when they were due rather than from
+    when they ran, so that they do not drift. A job running more than a
+    period late skips the periods already over: it runs once, not in a
+    burst catching up with each of them.
+    """
+
+    def __init__(self, timefunc, delayfunc):
+        sched.scheduler.__init__(self, timefunc, delayfunc)
+        dict.__init__(self)
+
+    def repeat(self, name, delay, action, args=tuple(), first_delay=None):
+        """Run action every delay, the first time after first_delay if given"""
+        if first_delay is None:
+            first_delay = delay
+        self._repeat_at(name, self.timefunc() + first_delay, delay, action, args)
+
+    def _repeat_at(self, name, due, delay, action, args):
+        self[name] = sched.scheduler.enterabs(self, due, 1, self._repeat, (name, due, delay, action, args))
+
+    def _repeat(self, name, due, delay, action, args):
+        del(self[name])
+        due += delay
+        now = self.timefunc()
+        if due <= now:
+            due += ((now-due) // delay + 1) * delay
+        self._repeat_at(name, due, delay, action, args)
+        action(*args)
+
+    def single_shot(self, name, delay, action, args=tuple()):
+        self[name] = sched.scheduler.enter(self, delay, 1, self._single_shot, (name, action, args))
+
+    def _single_shot(self, name, action, args):
+        del(self[name])
+        action(*args)
+
+    def cancel(self, name):
+        if name in self:
+            sched.scheduler.cancel(self, self.pop(name))
+
+
+class Tetromino:
+    SUPER_ROTATION_SYSTEM = (
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, -1), Point(0, 2), Point(1, 2)),
+            Rotation.CLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, -1), Point(0, 2), Point(-1, 2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, 1), Point(0, -2), Point(1, -2)),
+            Rotation.CLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, 1), Point(0, -2), Point(1, -2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, -1), Point(0, 2), Point(-1, 2)),
+            Rotation.CLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, -1), Point(0, 2), Point(1, 2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, 1), Point(0, -2), Point(-1, -2)),
+            Rotation.CLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, 1), Point(0, 2), Point(-1, -2))
+        }
+    )
+
+    def __init__(self, matrix, position):
+        self.matrix = matrix
+        self.position = position
+        self.reset()
+        self.rotation_point_5_used = False
+        self.rotated_last = False
+        self.hold_enabled = True
+
+    @classmethod
+    def build_tables(cls):
+        """Precompute minoes, line masks and kicks of each orientation
+
+        ORIENTATIONS[o] and MASKS[o] are the minoes positions and line masks
+        of orientation o, o being the number of clockwise rotations from
+        MINOES_POSITIONS. BOTTOMS[o] are the (dx, dy) of the lowest mino of
+        each column. KICKS[o][direction] are the (dx, dy) offsets to try in
+        order, from SUPER_ROTATION_SYSTEM, when rotating from o.
+        """
+        orientations = [cls.MINOES_POSITIONS]
+        for orientation in range(3):
+            orientations.append(tuple(
+                Point(-mino_position.y, mino_position.x)
+                for mino_position in orientations[-1]
+            ))
+        cls.ORIENTATIONS = tuple(orientations)
+        cls.MASKS = tuple(line_masks(minoes_positions) for minoes_positions in orientations)
+        bottoms = []
+        for minoes_positions in orientations:
+            columns = {}
+            for mino_position in minoes_positions:
+                columns[mino_position.x] = max(columns.get(mino_position.x, mino_position.y), mino_position.y)
+            bottoms.append(tuple(sorted(columns.items())))
+        cls.BOTTOMS = tuple(bottoms)
+        cls.KICKS = tuple(
+            dict(
+                (direction, tuple((kick.x, kick.y) for kick in kicks))
+                for direction, kicks in liberty_degrees.items()
+            )
+            for liberty_degrees in cls.SUPER_ROTATION_SYSTEM
+        )
+
+    def reset(self):
+        self.orientation = 0
+        self.minoes_positions = self.ORIENTATIONS[0]
+        self.masks = self.MASKS[0]
+
+    def move_rotate(self, dx, dy, masks):
+        x = self.position.x + dx
+        y = self.position.y + dy
+        if self.matrix.is_free_piece(x, y, masks):
+            self.position = Point(x, y)
+            scheduler = self.matrix.game.scheduler
+            if "lock" in scheduler:
+                scheduler.cancel("lock")
+                scheduler.single_shot("lock", self.matrix.game.stats.lock_delay, self.matrix.lock)
+            return True
+        else:
+            return False
+
+    def move(self, movement, lock=True, refresh=True):
+        if self.move_rotate(movement.x, movement.y, self.masks):
+            self.rotated_last = False
+            if refresh:
+                self.matrix.game.emit("move")
+            return True
+        else:
+            scheduler = self.matrix.game.scheduler
+            if (
+                lock
+                and movement == Movement.DOWN
+                and "lock" not in scheduler
+            ):
+                scheduler.single_shot("lock", self.matrix.game.stats.lock_delay, self.matrix.lock)
+                self.matrix.game.emit("lock delay")
+            return False
+
+    def rotate(self, direction):
+        orientation = (self.orientation+direction) % 4
+        masks = self.MASKS[orientation]
+        for rotation_point, (dx, dy) in enumerate(self.KICKS[self.orientation][direction], start=1):
+            if self.move_rotate(dx, dy, masks):
+                self.orientation = orientation
+                self.minoes_positions = self.ORIENTATIONS[orientation]
+                self.masks = masks
+                self.rotated_last = True
+                if rotation_point == 5:
+                    self.rotation_point_5_used = True
+                self.matrix.game.emit("rotate", rotation_point)
+                return True
+        else:
+            return False
+
+    def soft_drop(self):
+        if self.move(Movement.DOWN):
+            self.matrix.game.stats.piece_dropped(1)
+
+    def drop_distance(self):
+        return self.matrix.drop_distance(self.position.x, self.position.y, self.BOTTOMS[self.orientation], self.masks)
+
+    def hard_drop(self):
+        lines = self.drop_distance()
+        if lines and self.move_rotate(0, lines, self.masks):
+            self.rotated_last = False
+        self.matrix.game.emit("move")
+        self.matrix.game.stats.piece_dropped(2*lines)
+        self.matrix.lock()
+
+    def fall(self):
+        """Fall the Stats.fall_rows rows due, at once, and start the lock delay if it lands"""
+        rows = self.matrix.game.stats.fall_rows
+        distance = min(rows, self.drop_distance())
+        if distance and self.move_rotate(0, distance, self.masks):
+            self.rotated_last = False
+            self.matrix.game.emit("fall")
+        if distance < rows:
+            self.move(Movement.DOWN, refresh=False)
+
+    def t_spin(self):
+        return ""
+
+
+class O(Tetromino):
+    SUPER_ROTATION_SYSTEM = tuple()
+    MINOES_POSITIONS = (Point(0, 0), Point(1, 0), Point(0, -1), Point(1, -1))
+
+    def rotate(self, direction):
+        return False
+
+class I(Tetromino):
+    SUPER_ROTATION_SYSTEM = (
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, 1), Point(-1, 1), Point(2, 1), Point(-1, -1), Point(2, 2)),
+            Rotation.CLOCKWISE: (Point(1, 0), Point(-1, 0), Point(2, 0), Point(-1, 1), Point(2, -2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(-1, 0), Point(1, 0), Point(-2, 0), Point(1, -1), Point(-2, 2)),
+            Rotation.CLOCKWISE: (Point(0, 1), Point(-1, 1), Point(2, 1), Point(-1, -1), Point(2, 2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(0, -1), Point(1, -1), Point(-2, -1), Point(1, 1), Point(-2, -2)),
+            Rotation.CLOCKWISE: (Point(-1, 0), Point(1, 0), Point(-2, 0), Point(1, -1), Point(-2, 2)),
+        },
+        {
+            Rotation.COUNTERCLOCKWISE: (Point(1, 0), Point(-1, 0), Point(2, 0), Point(-1, 1), Point(2, -2)),
+            Rotation.CLOCKWISE: (Point(0, 1), Point(1, -1), Point(-2, -1), Point(1, 1), Point(-2, -2)),
+        },
+    )
+    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(1, 0), Point(2, 0))
+
+class T(Tetromino):
+    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(0, -1), Point(1, 0))
+    T_SLOT = (Point(-1, -1), Point(1, -1), Point(1, 1), Point(-1, 1))
+
+    @classmethod
+    def build_tables(cls):
+        """Also precompute the (dx, dy) of T-slot corners a, b, c, d of each orientation"""
+        super(T, cls).build_tables()
+        cls.T_CORNERS = tuple(
+            tuple(
+                (cls.T_SLOT[(corner+orientation) % 4].x, cls.T_SLOT[(corner+orientation) % 4].y)
+                for corner in (0, 1, 3, 2)
+            )
+            for orientation in range(4)
+        )
+
+    @classmethod
+    def t_spin_at(cls, matrix, x, y, orientation, rotated_last, rotation_point_5_used):
+        """T-spin kind of a T locking at x, y in orientation on matrix, also used by the bot"""
+        if rotated_last:
+            a, b, c, d = (
+                not matrix.is_free_cell(x+dx, y+dy)
+                for dx, dy in cls.T_CORNERS[orientation]
+            )
+
+            if rotation_point_5_used or (a and b and (c or d)):
+                return "T-SPIN"
+            elif c and d and (a or b):
+                return "MINI T-SPIN"
+        return ""
+
+    def t_spin(self):
+        return self.t_spin_at(
+            self.matrix, self.position.x, self.position.y, self.orientation,
+            self.rotated_last, self.rotation_point_5_used
+        )
+
+class L(Tetromino):
+    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(1, 0), Point(1, -1))
+
+class J(Tetromino):
+    MINOES_POSITIONS = (Point(-1, -1), Point(-1, 0), Point(0, 0), Point(1, 0))
+
+class S(Tetromino):
+    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(0, -1), Point(1, -1))
+
+class Z(Tetromino):
+    MINOES_POSITIONS = (Point(-1, -1), Point(0, -1), Point(0, 0), Point(1, 0))
+
+
+for tetromino_class in (O, I, T, L, J, S, Z):
+    tetromino_class.build_tables()
+
+
+class Matrix:
+    NB_COLS = 10
+    NB_LINES = 21
+
+    def __init__(self, game, nb_cols=NB_COLS, nb_lines=NB_LINES):
+        self.game = game
+        self.nb_cols = nb_cols
+        self.nb_lines = nb_lines
+        self.piece_position = Point(nb_cols//2 - 1, -1)
+        # Occupancy is kept as one bitmask per line, column x being bit x+2.
+        # Two always set bits on each side act as walls, so a whole piece is
+        # tested with one AND per line and bounds checks come for free.
+        # Cells hold the Tetromino class of each mino, for rendering.
+        self.empty_line = 0b11 | 0b11 << nb_cols+2
+        self.full_line = (1 << nb_cols+4) - 1
+        self.lines = [self.empty_line for y in range(nb_lines)]
+        # Surface of each column: line of its highest mino, nb_lines if empty
+        self.heights = [nb_lines for x in range(nb_cols)]
+        self.cells = [
+            [None for x in range(nb_cols)]
+            for y in range(nb_lines)
+        ]
+        self.piece = None
+
+    @classmethod
+    def from_lines(cls, lines, nb_cols=NB_COLS):
+        """Matrix of occupancy lines, without game, cells nor piece, to search placements on"""
+        matrix = cls.__new__(cls)
+        matrix.game = None
+        matrix.nb_cols = nb_cols
+        matrix.nb_lines = len(lines)
+        matrix.piece_position = Point(nb_cols//2 - 1, -1)
+        matrix.empty_line = 0b11 | 0b11 << nb_cols+2
+        matrix.full_line = (1 << nb_cols+4) - 1
+        matrix.lines = list(lines)
+        matrix.update_heights()
+        matrix.cells = None
+        matrix.piece = None
+        return matrix
+
+    def is_free_cell(self, x, y):
+        return (
+            0 <= x < self.nb_cols
+            and y < self.nb_lines
+            and not (y >= 0 and self.lines[y] >> x+2 & 1)
+        )
+
+    def is_free_piece(self, x, y, masks):
+        # Every tetromino has a mino at (0, 0), so its position must be inside
+        # the matrix, and its other minoes, at most 2 columns away, are then
+        # within the walls.
+        if not 0 <= x < self.nb_cols:
+            return False
+        for dy, mask in masks:
+            if y+dy >= self.nb_lines:
+                return False
+            line = self.lines[y+dy] if y+dy >= 0 else self.empty_line
+            if line & mask << x:
+                return False
+        return True
+
+    def drop_distance(self, x, y, bottoms, masks):
+        """Number of lines a piece at (x, y) can fall
+
+        If the piece is above the surface of all its columns, this is read
+        from the column heights; else the piece is under an overhang and it
+        is tried down line by line.
+        """
+        distance = self.nb_lines
+        for dx, dy in bottoms:
+            free_lines = self.heights[x+dx] - 1 - (y+dy)
+            if free_lines < 0:
+                break
+            distance = min(distance, free_lines)
+        else:
+            return distance
+        distance = 0
+        while self.is_free_piece(x, y+distance+1, masks):
+            distance += 1
+        return distance
+
+    def update_heights(self):
+        self.heights = [self.nb_lines for x in range(self.nb_cols)]
+        for y, line in enumerate(self.lines):
+            if line != self.empty_line:
+                for x in range(self.nb_cols):
+                    if self.heights[x] == self.nb_lines and line >> x+2 & 1:
+                        self.heights[x] = y
+
+    def lock(self):
+        if not self.piece.move(Movement.DOWN):
+            self.game.scheduler.cancel("fall")
+
+            t_spin = self.piece.t_spin()
+
+            for mino_position in self.piece.minoes_positions:
+                position = mino_position + self.piece.position
+                if position.y >= 0:
+                    self.cells[position.y][position.x] = self.piece.__class__
+                    self.lines[position.y] |= 1 << position.x+2
+                    self.heights[position.x] = min(self.heights[position.x], position.y)
+                else:
+                    self.game.over()
+                    return
+
+            remaining = [
+                (line, cells)
+                for line, cells in zip(self.lines, self.cells)
+                if line != self.full_line
+            ]
+            nb_lines_cleared = self.nb_lines - len(remaining)
+            if nb_lines_cleared:
+                self.lines = [self.empty_line for y in range(nb_lines_cleared)]
+                self.cells = [[None for x in range(self.nb_cols)] for y in range(nb_lines_cleared)]
+                for line, cells in remaining:
+                    self.lines.append(line)
+                    self.cells.append(cells)
+                self.update_heights()
+
+            self.game.stats.piece_locked(nb_lines_cleared, t_spin)
+            self.piece = None
+            self.game.new_piece()
+
+
+class Stats:
+    # Shortest time between gravity steps: faster gravity falls several
+    # rows per step, so that it costs no more than a step per frame
+    GRAVITY_TICK = 1 / 60
+    SCORES = (
+        {"name": "", "": 0, "MINI T-SPIN": 1, "T-SPIN": 4},
+        {"name": "SINGLE", "": 1, "MINI T-SPIN": 2, "T-SPIN": 8},
+        {"name": "DOUBLE", "": 3, "T-SPIN": 12},
+        {"name": "TRIPLE", "": 5, "T-SPIN": 16},
+        {"name": "TETRIS", "": 8}
+    )
+
+    def __init__(self, game, level=1, high_score=0):
+        self.game = game
+        self.level = max(1, level) - 1
+        self.goal = 0
+        self.score = 0
+        self.high_score = high_score
+        self.combo = -1
+        self.lines_cleared = 0
+        self.strings = []
+        self.fall_delay = 1
+        self.lock_delay = 0.5
+        self.new_level()
+
+    def new_level(self):
+        self.level += 1
+        # Gravity stops speeding up at level 20, where it is already 20G
+        gravity_level = min(self.level, 20)
+        self.fall_delay = pow(0.8 - ((gravity_level-1)*0.007), gravity_level-1)
+        self.update_gravity()
+        if self.level > 15:
+            self.lock_delay = 0.5 * pow(0.9, self.level-15)
+        self.goal += 5 * self.level
+        self.game.emit("level", self.level)
+
+    def update_gravity(self):
+        """Rows falling at each gravity step, and time between steps, for fall_delay per row"""
+        self.fall_rows = max(1, int(math.ceil(self.GRAVITY_TICK / self.fall_delay)))
+        self.fall_period = self.fall_rows * self.fall_delay
+
+    def piece_dropped(self, lines):
+        self.score += lines
+        if self.score > self.high_score:
+            self.high_score = self.score
+        self.game.emit("drop", lines)
+
+    def piece_locked(self, nb_lines, t_spin):
+        self.strings = []
+
+        if t_spin:
+            self.strings.append(t_spin)
+        if nb_lines:
+            self.strings.append(self.SCORES[nb_lines]["name"])
+            self.combo += 1
+        else:
+            self.combo = -1
+
+        if nb_lines or t_spin:
+            self.lines_cleared += nb_lines
+            ds = self.SCORES[nb_lines].get(t_spin, self.SCORES[nb_lines][""])
+            self.goal -= ds
+            ds *= 100 * self.level
+            self.score += ds
+            self.strings.append(str(ds))
+
+        if self.combo >= 1:
+            self.strings.append("COMBO x%d" % self.combo)
+            ds = (20 if nb_lines==1 else 50) * self.combo * self.level
+            self.score += ds
+            self.strings.append(str(ds))
+
+        if self.score > self.high_score:
+            self.high_score = self.score
+        self.game.emit("lock", nb_lines, t_spin)
+        if self.goal <= 0:
+            self.new_level()
+
+
+class Engine:
+    """Game rules: matrix, active, hold and next pieces, 7-bag and scoring
+
+    step(action, dt) advances the game clock by dt seconds, firing gravity and
+    lock delay on the way, then applies action, one of ACTIONS or None. It
+    never sleeps nor draws, and returns the events of this step, tuples whose
+    first item is the event name.
+    """
+
+    ACTIONS = (
+        "MOVE LEFT",
+        "MOVE RIGHT",
+        "SOFT DROP",
+        "HARD DROP",
+        "ROTATE CLOCKWISE",
+        "ROTATE COUNTER",
+        "HOLD",
+        "PAUSE"
+    )
+    TETROMINOES = (O, I, T, L, J, S, Z)
+
+    def __init__(self, level=1, seed=None, high_score=0, nb_cols=Matrix.NB_COLS, nb_lines=Matrix.NB_LINES):
+        self.time = 0
+        self.scheduler = Scheduler(self.clock, lambda delay: None)
+        self.events = []
+        # Called with each event as it is emitted, see eventlog.Observer
+        self.observer = None
+        self.paused = False
+        self.game_over = False
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.random_bag = []
+        self.matrix = Matrix(self, nb_cols, nb_lines)
+        self.stats = Stats(self, level, high_score)
+        self.hold_piece = None
+        self.next_piece = self.random_piece()
+        self.actions = {
+            "MOVE LEFT": lambda: self.matrix.piece.move(Movement.LEFT),
+            "MOVE RIGHT": lambda: self.matrix.piece.move(Movement.RIGHT),
+            "SOFT DROP": lambda: self.matrix.piece.soft_drop(),
+            "HARD DROP": lambda: self.matrix.piece.hard_drop(),
+            "ROTATE CLOCKWISE": lambda: self.matrix.piece.rotate(Rotation.CLOCKWISE),
+            "ROTATE COUNTER": lambda: self.matrix.piece.rotate(Rotation.COUNTERCLOCKWISE),
+            "HOLD": self.swap
+        }
+        self.new_piece()
+
+    def clock(self):
+        return self.time
+
+    def emit(self, *event):
+        self.events.append(event)
+        if self.observer:
+            self.observer(event)
+
+    def step(self, action=None, dt=0):
+        self.events = []
+        if not (self.paused or self.game_over):
+            deadline = self.time + dt
+            # Fire each due event at its own time, so that repeated events
+            # are rescheduled from when they were due.
+            while not self.game_over:
+                queue = self.scheduler.queue
+                if not queue or queue[0].time > deadline:
+                    break
+                self.time = max(self.time, queue[0].time)
+                self.scheduler.run(False)
+            if not self.game_over:
+                self.time = deadline
+        if action == "PAUSE":
+            self.pause()
+        elif action is not None and not (self.paused or self.game_over):
+            self.actions[action]()
+        return self.events
+
+    def next_event_delay(self):
+        """Game time until the next gravity or lock event, None if there is none"""
+        if self.scheduler.empty() or self.paused or self.game_over:
+            return None
+        return self.scheduler.queue[0].time - self.time
+
+    def random_piece(self):
+        if not self.random_bag:
+            self.random_bag = list(self.TETROMINOES)
+            self.random.shuffle(self.random_bag)
+        return self.random_bag.pop()(self.matrix, self.matrix.piece_position)
+
+    def new_piece(self):
+        self.scheduler.cancel("lock")
+        if not self.matrix.piece:
+            self.matrix.piece, self.next_piece = self.next_piece, self.random_piece()
+            self.emit("new piece")
+        self.matrix.piece.position = self.matrix.piece_position
+        if self.matrix.piece.move(Movement.DOWN):
+            self.scheduler.repeat("fall", self.stats.fall_period, self.matrix.piece.fall)
+        else:
+            self.over()
+
+    def pause(self):
+        if not self.game_over:
+            self.paused = not self.paused
+            self.emit("pause", self.paused)
+
+    def swap(self):
+        if self.matrix.piece.hold_enabled:
+            self.scheduler.cancel("fall")
+            self.scheduler.cancel("lock")
+            self.matrix.piece, self.hold_piece = self.hold_piece, self.matrix.piece
+            self.hold_piece.reset()
+            self.hold_piece.hold_enabled = False
+            self.emit("hold")
+            self.new_piece()
+
+    def over(self):
+        self.scheduler.cancel("fall")
+        self.scheduler.cancel("lock")
+        self.game_over = True
+        self.emit("over")
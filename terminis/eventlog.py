@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""Game events written as JSON lines, for analytics
+
+terminis --event-log[=FILE]
+terminis --serve=HOST:PORT --event-log[=FILE]
+
+Each spawn, move, rotation (with the index of the kick used), hold, lock,
+line clear, T-spin, combo, level up, pause and game over of a game is a
+JSON object on its own line, with the game it belongs to, the game time and
+the event name, followed by the fields of this event. An engine reports its
+events to the Observer of the game as they are emitted, which only copies a
+few values into a tuple and appends it to the pending records of the
+EventLog. A writer thread wakes every FLUSH_DELAY seconds, or as soon as
+BATCH_SIZE records are pending, to encode them and append them to the file
+in one write, so the game never waits for the disk.
+
+Once the file grows past max_size, it is renamed FILE.1, FILE.1 is renamed
+FILE.2, and so on up to FILE.<backups>, which is removed. Several processes
+can log into the same file: rotation is done while holding a lock on
+FILE.lock, and a writer reopens the file when another one has rotated it.
+"""
+
+import collections
+import json
+import os
+import threading
+
+from . import scores
+
+
+class EventLog:
+    MAX_SIZE = 16 << 20
+    BACKUPS = 5
+    FLUSH_DELAY = 1
+    BATCH_SIZE = 4096
+
+    def __init__(self, path, max_size=MAX_SIZE, backups=BACKUPS):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.lock_path = path + ".lock"
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.f = open(path, "ab")
+        # deque appends and pops are atomic: the game thread and the
+        # writer thread share it without a lock
+        self.pending = collections.deque()
+        self.error = None
+        self.closed = False
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="event log", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        """Queue record, a (game, time, event, fields) tuple, fields being a tuple of (name, value) pairs"""
+        self.pending.append(record)
+        if len(self.pending) >= self.BATCH_SIZE:
+            self.wake.set()
+
+    def observe(self, engine, event="start", **fields):
+        """Log the events of engine from now on, beginning with event, which tells the pieces in play"""
+        observer = Observer(self, engine)
+        engine.observer = observer
+        piece = engine.matrix.piece
+        observer.record(
+            event,
+            piece=piece.__class__.__name__ if piece else None,
+            next=engine.next_piece.__class__.__name__,
+            **fields
+        )
+        return observer
+
+    def run(self):
+        while not self.closed:
+            self.wake.wait(self.FLUSH_DELAY)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+        self.f.close()
+
+    def flush(self):
+        """Write the pending records, BATCH_SIZE at a time"""
+        pending = self.pending
+        while pending:
+            lines = []
+            while pending and len(lines) < self.BATCH_SIZE:
+                game, game_time, event, fields = pending.popleft()
+                record = collections.OrderedDict((("game", game), ("time", round(game_time, 3)), ("event", event)))
+                record.update(fields)
+                lines.append(json.dumps(record, separators=(",", ":")))
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            try:
+                self.reopen()
+                if self.size() + len(data) > self.max_size:
+                    self.rotate()
+                self.f.write(data)
+                self.f.flush()
+            except OSError as e:
+                self.error = e
+
+    def size(self):
+        # Other processes may have appended to the file since our last write
+        return os.fstat(self.f.fileno()).st_size
+
+    def reopen(self):
+        """Follow the file to path if another process rotated it"""
+        try:
+            rotated = os.stat(self.path).st_ino != os.fstat(self.f.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self.f.close()
+            self.f = open(self.path, "ab")
+
+    def rotate(self):
+        with scores.Lock(self.lock_path):
+            # Another process may have rotated the file while waiting for the lock
+            self.reopen()
+            if self.size() == 0:
+                return
+            self.f.close()
+            for i in range(self.backups, 0, -1):
+                source = "%s.%d" % (self.path, i-1) if i > 1 else self.path
+                if os.path.exists(source):
+                    os.replace(source, "%s.%d" % (self.path, i))
+            self.f = open(self.path, "ab")
+
+    def close(self):
+        """Write the pending records and stop the writer thread, return the last write error if any"""
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
+        return self.error
+
+
+class Observer:
+    """Turns the events an engine emits into records of an EventLog"""
+
+    def __init__(self, log, engine):
+        self.log = log
+        self.engine = engine
+        self.game = "%016x" % engine.seed
+
+    def record(self, event, **fields):
+        self.log.write((self.game, self.engine.time, event, tuple(fields.items())))
+
+    def piece_fields(self, piece):
+        return (
+            ("piece", piece.__class__.__name__),
+            ("x", piece.position.x),
+            ("y", piece.position.y),
+            ("orientation", piece.orientation)
+        )
+
+    def __call__(self, event):
+        engine = self.engine
+        name = event[0]
+        write = self.log.write
+        game_time = engine.time
+        if name == "move":
+            write((self.game, game_time, "move", self.piece_fields(engine.matrix.piece)))
+        elif name == "rotate":
+            write((self.game, game_time, "rotate", self.piece_fields(engine.matrix.piece) + (("kick", event[1]),)))
+        elif name == "new piece":
+            write((self.game, game_time, "spawn", (
+                ("piece", engine.matrix.piece.__class__.__name__),
+                ("next", engine.next_piece.__class__.__name__)
+            )))
+        elif name == "hold":
+            write((self.game, game_time, "hold", (
+                ("piece", engine.hold_piece.__class__.__name__),
+                ("swapped", engine.matrix.piece.__class__.__name__ if engine.matrix.piece else None)
+            )))
+        elif name == "lock":
+            nb_lines, t_spin = event[1:]
+            stats = engine.stats
+            write((self.game, game_time, "lock", self.piece_fields(engine.matrix.piece) + (
+                ("lines", nb_lines),
+                ("score", stats.score)
+            )))
+            if nb_lines:
+                write((self.game, game_time, "clear", (
+                    ("lines", nb_lines),
+                    ("name", stats.SCORES[nb_lines]["name"]),
+                    ("total", stats.lines_cleared)
+                )))
+            if t_spin:
+                write((self.game, game_time, "t-spin", (("kind", t_spin), ("lines", nb_lines))))
+            if stats.combo >= 1:
+                write((self.game, game_time, "combo", (("count", stats.combo),)))
+        elif name == "level":
+            stats = engine.stats
+            write((self.game, game_time, "level", (
+                ("level", event[1]),
+                ("fall_delay", stats.fall_delay),
+                ("lock_delay", stats.lock_delay)
+            )))
+        elif name == "pause":
+            write((self.game, game_time, "pause", (("paused", event[1]),)))
+        elif name == "over":
+            stats = engine.stats
+            write((self.game, game_time, "over", (
+                ("score", stats.score),
+                ("lines", stats.lines_cleared),
+                ("level", stats.level)
+            )))
+
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""Micro-benchmarks of the engine and renderer hot paths
+
+python -m terminis.microbench [options]
+
+Runs without a terminal: the matrix window draws into a fake curses
+window. Each benchmark reports the median time per operation, in
+nanoseconds, over several rounds, which run every benchmark in turn, so
+that a busy moment of the machine slows down one round of each rather
+than all rounds of one. Results can be written to a JSON file and
+compared with a previous one, failing on regressions.
+"""
+
+import sys
+import json
+import platform
+import statistics
+import time
+
+from .engine import Engine, I, Movement, Point, Rotation, T
+
+
+HELP_MSG = """python -m terminis.microbench [options]
+
+  --help\t-h\tshow command usage (this message)
+  --output=FILE\t\twrite results as JSON into FILE
+  --baseline=FILE\tcompare with results previously written into FILE
+  --threshold=x\t\tfail if a benchmark is more than x times slower than
+\t\t\tthe baseline (default 1.5)
+  --rounds=n\t\tkeep the median of n rounds (default 5, at least 5
+\t\t\twith --baseline)"""
+
+ROUNDS = 5
+# Fewer rounds do not filter out the busy moments of the machine
+MIN_BASELINE_ROUNDS = 5
+THRESHOLD = 1.5
+
+
+class FakeWindow:
+    """Stands for a curses window, accepting and discarding drawing calls"""
+
+    def __init__(self, *args):
+        pass
+
+    def addstr(self, *args):
+        pass
+
+    def hline(self, *args):
+        pass
+
+    def erase(self):
+        pass
+
+    def border(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+
+def fill(matrix, y, holes=()):
+    """Fill line y of matrix, but for the columns in holes"""
+    for x in range(matrix.nb_cols):
+        if x not in holes:
+            matrix.cells[y][x] = I
+            matrix.lines[y] |= 1 << x+2
+    matrix.update_heights()
+
+
+def place(engine, tetromino_class, x, y, orientation=0):
+    piece = tetromino_class(engine.matrix, Point(x, y))
+    piece.orientation = orientation
+    piece.minoes_positions = piece.ORIENTATIONS[orientation]
+    piece.masks = piece.MASKS[orientation]
+    engine.matrix.piece = piece
+    return piece
+
+
+def half_full_engine():
+    engine = Engine(seed=0)
+    for y in range(engine.matrix.nb_lines//2, engine.matrix.nb_lines):
+        fill(engine.matrix, y, holes=(y % engine.matrix.nb_cols,))
+    return engine
+
+
+def walled_in_t_engine():
+    """A T in a hole of its own shape, so that every kick of a rotation fails"""
+    engine = Engine(seed=0)
+    for y in range(engine.matrix.nb_lines):
+        fill(engine.matrix, y)
+    piece = place(engine, T, 4, engine.matrix.nb_lines - 2)
+    for mino_position in piece.minoes_positions:
+        x = piece.position.x + mino_position.x
+        y = piece.position.y + mino_position.y
+        engine.matrix.cells[y][x] = None
+        engine.matrix.lines[y] &= ~(1 << x+2)
+    engine.matrix.update_heights()
+    return engine
+
+
+def lock_engine(nb_lines):
+    """A vertical I at the bottom of column 0, about to clear nb_lines lines"""
+    engine = Engine(seed=0)
+    bottom = engine.matrix.nb_lines - 1
+    for y in range(bottom-3, bottom+1):
+        if bottom - y < nb_lines:
+            fill(engine.matrix, y, holes=(0,))
+        else:
+            fill(engine.matrix, y, holes=(0, 1))
+    place(engine, I, 0, bottom-2, orientation=1)
+    return engine
+
+
+def t_spin_engine():
+    """A T just rotated into a T-slot"""
+    engine = Engine(seed=0)
+    bottom = engine.matrix.nb_lines - 1
+    fill(engine.matrix, bottom, holes=(4,))
+    fill(engine.matrix, bottom-1, holes=(3, 4, 5))
+    fill(engine.matrix, bottom-2, holes=(4, 5))
+    piece = place(engine, T, 4, bottom-1, orientation=2)
+    piece.rotated_last = True
+    return engine
+
+
+def bench_is_free_cell(number):
+    matrix = half_full_engine().matrix
+    cells = [
+        (x, y)
+        for y in range(-1, matrix.nb_lines+1)
+        for x in range(-1, matrix.nb_cols+1)
+    ]
+    is_free_cell = matrix.is_free_cell
+    rounds = max(1, number // len(cells))
+    start = time.perf_counter()
+    for i in range(rounds):
+        for x, y in cells:
+            is_free_cell(x, y)
+    return time.perf_counter() - start, rounds * len(cells)
+
+
+def bench_move(number):
+    engine = half_full_engine()
+    piece = engine.matrix.piece
+    start = time.perf_counter()
+    for i in range(number // 2):
+        piece.move(Movement.LEFT)
+        piece.move(Movement.RIGHT)
+        del engine.events[:]
+    return time.perf_counter() - start, number // 2 * 2
+
+
+def bench_rotate_all_kicks(number):
+    piece = walled_in_t_engine().matrix.piece
+    start = time.perf_counter()
+    for i in range(number):
+        piece.rotate(Rotation.CLOCKWISE)
+    return time.perf_counter() - start, number
+
+
+def bench_hard_drop(number):
+    pieces = [half_full_engine().matrix.piece for i in range(number)]
+    start = time.perf_counter()
+    for piece in pieces:
+        piece.hard_drop()
+    return time.perf_counter() - start, number
+
+
+def bench_lock(nb_lines):
+    def bench(number):
+        matrices = [lock_engine(nb_lines).matrix for i in range(number)]
+        start = time.perf_counter()
+        for matrix in matrices:
+            matrix.lock()
+        return time.perf_counter() - start, number
+    return bench
+
+
+def bench_t_spin(number):
+    piece = t_spin_engine().matrix.piece
+    assert piece.t_spin() == "T-SPIN"
+    start = time.perf_counter()
+    for i in range(number):
+        piece.t_spin()
+    return time.perf_counter() - start, number
+
+
+def bench_piece_locked(number):
+    engine = Engine(seed=0)
+    stats = engine.stats
+    outcomes = ((0, ""), (1, ""), (2, "T-SPIN"), (0, "MINI T-SPIN"), (4, ""), (0, ""))
+    start = time.perf_counter()
+    for i in range(number // len(outcomes)):
+        for nb_lines, t_spin in outcomes:
+            stats.piece_locked(nb_lines, t_spin)
+        del engine.events[:]
+    return time.perf_counter() - start, number // len(outcomes) * len(outcomes)
+
+
+def matrix_window(engine):
+    """A curses Matrix window of engine drawing into a FakeWindow"""
+    import curses
+    from . import terminis
+
+    class Frontend:
+        WIDTH = terminis.Game.WIDTH
+        HEIGHT = terminis.Game.HEIGHT
+        color_pairs = dict.fromkeys(Engine.TETROMINOES, 0)
+        compositor = terminis.Compositor()
+        low_bandwidth = None
+        hint = None
+        blink = 0
+
+    Frontend.engine = engine
+    if not hasattr(curses, "ACS_HLINE"): # only defined once curses is initialized
+        curses.ACS_HLINE = ord("-")
+    newwin = curses.newwin
+    curses.newwin = FakeWindow
+    try:
+        return terminis.Matrix(Frontend(), 0, 0)
+    finally:
+        curses.newwin = newwin
+
+
+def bench_refresh(full, repaint):
+    def bench(number):
+        engine = Engine(seed=0)
+        if full:
+            for y in range(1, engine.matrix.nb_lines):
+                fill(engine.matrix, y, holes=(y % engine.matrix.nb_cols,))
+        piece = place(engine, T, 4, 0)
+        window = matrix_window(engine)
+        start = time.perf_counter()
+        for i in range(number // 2):
+            for movement in (Movement.LEFT, Movement.RIGHT):
+                piece.move(movement)
+                if repaint:
+                    window.frame = None
+                window.refresh()
+            del engine.events[:]
+        return time.perf_counter() - start, number // 2 * 2
+    return bench
+
+
+BENCHMARKS = (
+    ("Matrix.is_free_cell", bench_is_free_cell, 100000),
+    ("Tetromino.move", bench_move, 50000),
+    ("Tetromino.rotate all kicks", bench_rotate_all_kicks, 50000),
+    ("Tetromino.hard_drop", bench_hard_drop, 2000),
+    ("Matrix.lock 0 line", bench_lock(0), 2000),
+    ("Matrix.lock 1 line", bench_lock(1), 2000),
+    ("Matrix.lock 2 lines", bench_lock(2), 2000),
+    ("Matrix.lock 3 lines", bench_lock(3), 2000),
+    ("Matrix.lock 4 lines", bench_lock(4), 2000),
+    ("T.t_spin", bench_t_spin, 50000),
+    ("Stats.piece_locked", bench_piece_locked, 50000),
+    ("Matrix.refresh empty board", bench_refresh(False, False), 5000),
+    ("Matrix.refresh full board", bench_refresh(True, False), 5000),
+    ("Matrix.refresh empty board repaint", bench_refresh(False, True), 2000),
+    ("Matrix.refresh full board repaint", bench_refresh(True, True), 2000),
+)
+
+
+def run(rounds=ROUNDS):
+    """Median time per operation of each benchmark, in nanoseconds"""
+    times = dict((name, []) for name, bench, number in BENCHMARKS)
+    for i in range(rounds):
+        for name, bench, number in BENCHMARKS:
+            seconds, ops = bench(number)
+            times[name].append(seconds / ops)
+    return dict((name, statistics.median(name_times) * 1e9) for name, name_times in times.items())
+
+
+def regressions(results, baseline, threshold):
+    """(name, baseline, result) of benchmarks more than threshold times slower"""
+    return [
+        (name, baseline[name], result)
+        for name, result in sorted(results.items())
+        if name in baseline and result > baseline[name] * threshold
+    ]
+
+
+def parse_option(name, default=None):
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + "="):
+            return arg[len(name)+1:]
+    return default
+
+
+def main():
+    if "--help" in sys.argv[1:] or "-h" in sys.argv[1:]:
+        print(HELP_MSG)
+        return
+    try:
+        rounds = int(parse_option("--rounds", ROUNDS))
+        threshold = float(parse_option("--threshold", THRESHOLD))
+    except ValueError:
+        sys.exit(HELP_MSG)
+    if rounds < 1:
+        sys.exit(HELP_MSG)
+    baseline_path = parse_option("--baseline")
+    if baseline_path and rounds < MIN_BASELINE_ROUNDS:
+        sys.exit("Comparing with a baseline needs at least %d rounds" % MIN_BASELINE_ROUNDS)
+
+    results = run(rounds)
+    for name, result in sorted(results.items()):
+        print("%-40s%12.0f ns" % (name, result))
+
+    output_path = parse_option("--output")
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results
+            }, f, indent=2, sort_keys=True)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        slower = regressions(results, baseline, threshold)
+        for name, before, after in slower:
+            print("REGRESSION\t%s: %.0f ns -> %.0f ns (x%.2f)" % (name, before, after, after/before))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Korobeiniki on the PC speaker, sequenced in process
+
+Notes of TUNE are "length:note" pairs, lengths in LENGTHS milliseconds and
+notes in scientific pitch notation. Music plays them one after the other
+with jobs of a Scheduler, so that it pauses and resumes where it was
+without any process, and sounds through the first available Speaker.
+"""
+
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+
+LENGTHS = {"dc": 100, "dcp": 150, "c": 200, "cp": 300, "n": 400, "np": 600, "b": 800, "bp": 1200, "r": 1600}
+NOTE_NAMES = ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B")
+THEME = """
+    n:E5 c:B4 c:C5 c:D5 dc:E5 dc:D5 c:C5 c:B4
+    n:A4 c:A4 c:C5 n:E5 c:D5 c:C5
+    c:B4 c:E4 c:Ab4 c:C5 n:D5 n:E5
+    n:C5 n:A4 n:A4 c:B3 c:C4
+    np:D5 c:F5 c:A5 dc:A5 dc:A5 c:G5 c:F5
+    n:E5 c:E5 c:C5 c:E5 dc:F5 dc:E5 c:D5 c:C5
+    c:B4 c:E4 c:Ab4 c:C5 n:D5 n:E5
+    n:C5 n:A4 b:A4
+"""
+TUNE = THEME * 2 + """
+    b:E5 b:C5 b:D5 b:B4 b:C5 b:A4 b:Ab4 c:B4 c:E4 c:Ab4 c:B4
+    b:E5 b:C5 b:D5 b:B4 n:C5 n:E5 n:A5 n:A5 r:Ab5
+"""
+
+
+def frequency(note):
+    """Frequency in Hz of a note such as "Ab4", A4 being 440 Hz"""
+    name, octave = note[:-1], int(note[-1])
+    semitones = NOTE_NAMES.index(name) + 12*octave - 57
+    return 440 * 2 ** (semitones / 12)
+
+
+def parse(tune):
+    """(frequency, seconds) of each note of tune"""
+    notes = []
+    for token in tune.split():
+        length, note = token.split(":")
+        notes.append((frequency(note), LENGTHS[length] / 1000))
+    return notes
+
+
+class Speaker:
+    """PC speaker through the pcspkr input device, or the console, as beep does"""
+
+    EVDEV_PATH = "/dev/input/by-path/platform-pcspkr-event-spkr"
+    INPUT_EVENT = struct.Struct("llHHi")
+    EV_SND = 0x12
+    SND_TONE = 0x02
+    CONSOLE_PATHS = ("/dev/tty0", "/dev/console")
+    KIOCSOUND = 0x4B2F
+    CLOCK_TICK_RATE = 1193180
+
+    def __init__(self):
+        """Raise OSError if no speaker can be driven"""
+        if fcntl is None:
+            raise OSError("no PC speaker available")
+        try:
+            self.fd = os.open(self.EVDEV_PATH, os.O_WRONLY)
+        except OSError:
+            self.evdev = False
+            for path in self.CONSOLE_PATHS:
+                try:
+                    self.fd = os.open(path, os.O_WRONLY)
+                except OSError:
+                    continue
+                try:
+                    fcntl.ioctl(self.fd, self.KIOCSOUND, 0)
+                except OSError:
+                    os.close(self.fd)
+                    continue
+                break
+            else:
+                raise OSError("no PC speaker available")
+        else:
+            self.evdev = True
+
+    def tone(self, hz):
+        """Sound at hz Hz, or stop sounding if hz is 0"""
+        if self.evdev:
+            os.write(self.fd, self.INPUT_EVENT.pack(0, 0, self.EV_SND, self.SND_TONE, int(hz)))
+        else:
+            fcntl.ioctl(self.fd, self.KIOCSOUND, int(self.CLOCK_TICK_RATE / hz) if hz else 0)
+
+    def close(self):
+        self.tone(0)
+        os.close(self.fd)
+
+
+class Music:
+    def __init__(self, scheduler, tune=TUNE):
+        self.scheduler = scheduler
+        self.notes = parse(tune)
+        self.position = 0
+        self.playing = False
+        try:
+            self.speaker = Speaker()
+        except OSError:
+            self.speaker = None
+
+    def play(self):
+        if self.speaker and not self.playing:
+            self.playing = True
+            self.next_note()
+
+    def next_note(self):
+        hz, seconds = self.notes[self.position]
+        self.position = (self.position+1) % len(self.notes)
+        try:
+            self.speaker.tone(hz)
+        except OSError:
+            self.close()
+        else:
+            self.scheduler.single_shot("music", seconds, self.next_note)
+
+    def stop(self):
+        if self.playing:
+            self.playing = False
+            self.scheduler.cancel("music")
+            try:
+                self.speaker.tone(0)
+            except OSError:
+                self.close()
+
+    def close(self):
+        self.scheduler.cancel("music")
+        self.playing = False
+        if self.speaker:
+            try:
+                self.speaker.close()
+            except OSError:
+                pass
+            self.speaker = None
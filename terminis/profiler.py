@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""Frame time, input latency and scheduler lateness of a game
+
+A Profiler instruments a running game by replacing methods of its windows
+and schedulers with timed wrappers, so that nothing is measured, and
+nothing costs, when it is not created. Samples are grouped by name and
+reported as percentiles and histograms.
+"""
+
+import time
+
+
+class Profiler:
+    # Upper bounds of histogram buckets, in milliseconds
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250)
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def timed(self, name, function):
+        """function, recording the duration of each call under name"""
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed_function
+
+    def time_method(self, obj, method_name, name):
+        setattr(obj, method_name, self.timed(name, getattr(obj, method_name)))
+
+    def watch_scheduler(self, scheduler, lateness):
+        """Record how late each job of an engine.Scheduler runs
+
+        lateness(due) is the delay in seconds between the due time of a job,
+        in the clock of the scheduler, and now.
+        """
+        for method_name in ("_repeat", "_single_shot"):
+            setattr(scheduler, method_name, self.late(scheduler, lateness, getattr(scheduler, method_name)))
+
+    def late(self, scheduler, lateness, method):
+        def late_method(name, *args):
+            self.record("late " + name, lateness(scheduler[name].time))
+            method(name, *args)
+        return late_method
+
+    def report(self):
+        lines = []
+        for name, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            lines.append("%s\t%d samples\t%s" % (name, len(samples), " ".join(
+                "%s %.3f ms" % (label, 1000 * samples[min(len(samples)-1, int(len(samples)*p))])
+                for label, p in (("min", 0), ("median", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1))
+            )))
+            counts = [0 for bucket in self.BUCKETS]
+            for seconds in samples:
+                for i, bucket in enumerate(self.BUCKETS):
+                    if 1000 * seconds <= bucket:
+                        counts[i] += 1
+                        break
+            for bucket, count in zip(self.BUCKETS, counts):
+                if count:
+                    lines.append("\t<= %s ms\t%d" % (bucket, count))
+            over = len(samples) - sum(counts)
+            if over:
+                lines.append("\t> %s ms\t%d" % (self.BUCKETS[-1], over))
+        return "\n".join(lines)
+
+    def write(self, path):
+        try:
+            with open(path, "w") as f:
+                f.write(self.report() + "\n")
+        except Exception as e:
+            print("Profile could not be saved:")
+            print(e)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""Compact game recordings, replayed as fast as the CPU allows
+
+A recording starts with a header holding the 7-bag seed and the engine
+options, followed by one record per action and per gravity or lock event,
+and ends with the final score, lines and level. Time is counted in ticks
+of 1/1024 s: the recorded game is stepped with whole ticks, which are
+exact in floating point, so a replay reaches every action at exactly the
+same game time and follows the same course.
+"""
+
+import struct
+
+from .engine import Engine, Matrix
+
+
+MAGIC = b"TRMS"
+# Version 2 falls several rows per gravity event at high levels, version 3
+# moved LOCK above the T-spin bits
+VERSION = 3
+HEADER = struct.Struct("<4sBQBBB")
+TICKS_PER_SECOND = 1024
+# Record tags: action index, a successful gravity step, a lock (OR'ed with
+# the number of lines cleared and the T-spin index shifted by 3, below 0x38),
+# the end
+FALL = 0x08
+LOCK = 0x20
+END = 0xFF
+T_SPINS = ("", "MINI T-SPIN", "T-SPIN")
+
+
+class ReplayError(Exception):
+    pass
+
+
+def write_varint(f, n):
+    while n > 0x7F:
+        f.write(struct.pack("B", n & 0x7F | 0x80))
+        n >>= 7
+    f.write(struct.pack("B", n))
+
+
+def read_varint(f):
+    n = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ReplayError("truncated recording")
+        byte = ord(byte)
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n
+        shift += 7
+
+
+def event_tags(events):
+    for event in events:
+        if event[0] == "fall":
+            yield FALL
+        elif event[0] == "lock":
+            nb_lines, t_spin = event[1:]
+            yield LOCK | T_SPINS.index(t_spin) << 3 | nb_lines
+
+
+class Recorder:
+    """Play a game on its own engine and record it into the binary file f"""
+
+    def __init__(self, f, level=1, seed=None, high_score=0, nb_cols=Matrix.NB_COLS, nb_lines=Matrix.NB_LINES):
+        self.f = f
+        self.engine = Engine(level, seed, high_score, nb_cols, nb_lines)
+        self.f.write(HEADER.pack(MAGIC, VERSION, self.engine.seed, level, nb_cols, nb_lines))
+        self.time = 0
+        self.ticks = 0
+        self.action_ticks = 0
+
+    def step(self, action=None, dt=0):
+        self.time += dt
+        ticks = int(self.time * TICKS_PER_SECOND)
+        events = self.engine.step(action, (ticks-self.ticks) / float(TICKS_PER_SECOND))
+        self.ticks = ticks
+        if action is not None:
+            self.f.write(struct.pack("B", Engine.ACTIONS.index(action)))
+            write_varint(self.f, ticks - self.action_ticks)
+            self.action_ticks = ticks
+        for tag in event_tags(events):
+            self.f.write(struct.pack("B", tag))
+        return events
+
+    def close(self):
+        self.f.write(struct.pack("B", END))
+        write_varint(self.f, self.ticks - self.action_ticks)
+        stats = self.engine.stats
+        for n in (stats.score, stats.lines_cleared, stats.level):
+            write_varint(self.f, n)
+        self.f.close()
+
+
+def replay(f, on_events=None):
+    """Replay the recording read from binary file f and check its outcome
+
+    Returns the engine at the end of the game, raises ReplayError if the
+    recording is invalid or if the game did not unfold as recorded. If
+    given, on_events is called with the events of each step.
+    """
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ReplayError("truncated recording")
+    magic, version, seed, level, nb_cols, nb_lines = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ReplayError("not a Terminis recording")
+    if version != VERSION:
+        raise ReplayError("recording of version %d, this Terminis replays version %d" % (version, VERSION))
+    engine = Engine(level, seed, 0, nb_cols, nb_lines)
+    recorded = []
+    replayed = []
+    while True:
+        tag = f.read(1)
+        if not tag:
+            raise ReplayError("truncated recording")
+        tag = ord(tag)
+        if tag < len(Engine.ACTIONS):
+            dt = read_varint(f) / float(TICKS_PER_SECOND)
+            events = engine.step(Engine.ACTIONS[tag], dt)
+            if on_events:
+                on_events(events)
+            replayed.extend(event_tags(events))
+        elif tag == FALL or LOCK <= tag < END:
+            recorded.append(tag)
+        elif tag == END:
+            dt = read_varint(f) / float(TICKS_PER_SECOND)
+            events = engine.step(None, dt)
+            if on_events:
+                on_events(events)
+            replayed.extend(event_tags(events))
+            break
+        else:
+            raise ReplayError("unknown record 0x%02X" % tag)
+    outcome = tuple(read_varint(f) for n in range(3))
+    if replayed != recorded:
+        raise ReplayError("gravity and lock events differ from the recording")
+    stats = engine.stats
+    if (stats.score, stats.lines_cleared, stats.level) != outcome:
+        raise ReplayError(
+            "recorded score %d, lines %d, level %d but replayed %d, %d, %d"
+            % (outcome + (stats.score, stats.lines_cleared, stats.level))
+        )
+    return engine
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""Leaderboard shared by every player of a machine
+
+Each game is a line appended to LOG_NAME: date, user, score, lines, level
+and time in seconds, separated by tabs. INDEX_NAME holds the TOP_SIZE best
+games, the best score of each user, and the size of the log they account
+for, so that queries only read the records appended since it was written.
+Writers append and update the index while holding a lock on LOCK_NAME,
+and replace the index by renaming a complete file over it, so that
+readers never need the lock.
+
+Set the TERMINIS_SCORES_DIR environment variable to a directory writable
+by all players to share a leaderboard between them. Files are created with
+FILE_MODE, writable by their group whatever the umask of the player, so the
+directory should belong to a group of the players and have its setgid bit
+set, for the files created in it to belong to this group too:
+    install -d -m 2775 -g games /var/games/terminis
+"""
+
+import os
+import time
+import marshal
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+
+FILE_MODE = 0o664
+
+
+def open_shared(path, flags):
+    """File descriptor of path, created with FILE_MODE if it does not exist"""
+    fd = os.open(path, flags | os.O_CREAT | getattr(os, "O_BINARY", 0), FILE_MODE)
+    if hasattr(os, "fchmod"):
+        try:
+            if os.fstat(fd).st_mode & FILE_MODE != FILE_MODE:
+                os.fchmod(fd, FILE_MODE)
+        except OSError:
+            # Created by another player, who should have set its mode
+            pass
+    return fd
+
+
+class Lock:
+    """Exclusive lock on a file, held within a with block"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = os.fdopen(open_shared(self.path, os.O_RDONLY))
+        if fcntl:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+        self.f.close()
+
+
+class Leaderboard:
+    LOG_NAME = "scores.log"
+    INDEX_NAME = "scores.idx"
+    LOCK_NAME = "scores.lock"
+    INDEX_VERSION = 1
+    TOP_SIZE = 100
+
+    def __init__(self, dir_path):
+        self.dir_path = dir_path
+        self.log_path = os.path.join(dir_path, self.LOG_NAME)
+        self.index_path = os.path.join(dir_path, self.INDEX_NAME)
+        self.lock_path = os.path.join(dir_path, self.LOCK_NAME)
+
+    def record(self, user, score, lines, level, seconds):
+        """Append a game to the log and update the index"""
+        if not os.path.exists(self.dir_path):
+            os.makedirs(self.dir_path)
+        user = "".join(char for char in user if char.isprintable()) or "?"
+        line = "%s\t%s\t%d\t%d\t%d\t%d\n" % (
+            time.strftime("%Y-%m-%d %H:%M"), user, score, lines, level, seconds
+        )
+        with Lock(self.lock_path):
+            with os.fdopen(open_shared(self.log_path, os.O_WRONLY | os.O_APPEND), "ab") as f:
+                f.write(line.encode("utf-8"))
+            index = self.index()
+            temp_path = "%s.%d" % (self.index_path, os.getpid())
+            with os.fdopen(open_shared(temp_path, os.O_WRONLY | os.O_TRUNC), "wb") as f:
+                marshal.dump(index, f)
+            os.replace(temp_path, self.index_path)
+
+    def index(self):
+        """Index of the whole log: the last one written, updated with the records appended since"""
+        try:
+            with open(self.index_path, "rb") as f:
+                index = marshal.load(f)
+            if index["version"] != self.INDEX_VERSION:
+                raise ValueError
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            index = {
+                "version": self.INDEX_VERSION,
+                "offset": 0,
+                "games": 0,
+                "top": [],
+                "bests": {}
+            }
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(index["offset"])
+                data = f.read()
+        except OSError:
+            return index
+        # A line being appended by another process is left for later
+        end = data.rfind(b"\n") + 1
+        games = []
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            try:
+                date, user, score, lines, level, seconds = line.split("\t")
+                games.append((int(score), int(lines), int(level), int(seconds), date, user))
+            except ValueError:
+                continue
+        if games:
+            bests = index["bests"]
+            for game in games:
+                user = game[5]
+                if game[0] > bests.get(user, -1):
+                    bests[user] = game[0]
+            index["top"] = sorted(index["top"] + games, reverse=True)[:self.TOP_SIZE]
+            index["games"] += len(games)
+        index["offset"] += end
+        return index
+
+    def high_score(self):
+        try:
+            return self.index()["top"][0][0]
+        except IndexError:
+            return 0
+
+    def rank(self, user, index=None):
+        """(rank of the best score of user among players, number of players), None if user has no game"""
+        index = index or self.index()
+        bests = index["bests"]
+        if user not in bests:
+            return None
+        best = bests[user]
+        return 1 + sum(1 for score in bests.values() if score > best), len(bests)
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+"""Many games served over telnet by a single asyncio process
+
+terminis --serve=HOST:PORT
+
+Each connection plays its own Engine, driven by the keys it sends and by
+timeouts set to the engine's next deadline, and is drawn by a Screen that
+writes ANSI escape sequences of the cells changed since the last frame
+into the socket. The Display is drawn from broadcast.view, and is also
+used by spectators. Sessions sleep between events, and only hold an engine,
+two screen buffers and a few bytes of pending input.
+"""
+
+import asyncio
+import sys
+
+from .engine import Engine, Point, O, I, T, L, J, S, Z, format_time, summary
+from . import broadcast
+
+
+# Telnet commands
+IAC = 255
+SB, WILL, WONT, DO, DONT = 250, 251, 252, 253, 254
+SE = 240
+ECHO = 1
+SUPPRESS_GO_AHEAD = 3
+LINEMODE = 34
+# Ask the client to send each key as it is typed, without echoing it
+NEGOTIATION = bytes((IAC, WILL, ECHO, IAC, WILL, SUPPRESS_GO_AHEAD, IAC, DONT, LINEMODE))
+
+ESCAPE_SEQUENCES = {
+    b"\x1b[A": "KEY_UP",
+    b"\x1b[B": "KEY_DOWN",
+    b"\x1b[C": "KEY_RIGHT",
+    b"\x1b[D": "KEY_LEFT",
+    b"\x1bOA": "KEY_UP",
+    b"\x1bOB": "KEY_DOWN",
+    b"\x1bOC": "KEY_RIGHT",
+    b"\x1bOD": "KEY_LEFT"
+}
+CONTROLS = (
+    ("MOVE LEFT", "KEY_LEFT", "LEFT"),
+    ("MOVE RIGHT", "KEY_RIGHT", "RIGHT"),
+    ("SOFT DROP", "KEY_DOWN", "DOWN"),
+    ("HARD DROP", " ", "SPACE"),
+    ("ROTATE CLOCKWISE", "\n", "ENTER"),
+    ("ROTATE COUNTER", "KEY_UP", "UP"),
+    ("HOLD", "h", "H"),
+    ("PAUSE", "p", "P"),
+    ("QUIT", "q", "Q")
+)
+
+# SGR parameters of the colors of terminis.Game, on a white background
+COLORS = {
+    O: "1;33;47",
+    I: "1;36;47",
+    T: "1;35;47",
+    L: "33;47",
+    J: "1;34;47",
+    S: "1;32;47",
+    Z: "1;31;47"
+}
+BOLD = "1"
+DIM = "2"
+BLINK = "5;7"
+
+
+class Screen:
+    """Character cells of a terminal, sent as the changes since the last flush"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = [[(" ", "")] * width for y in range(height)]
+        self.sent = [[None] * width for y in range(height)]
+        self.background = [list(row) for row in self.cells]
+
+    def set_background(self):
+        """Make the current cells those restored by clear"""
+        self.background = [list(row) for row in self.cells]
+
+    def clear(self):
+        for row, background in zip(self.cells, self.background):
+            row[:] = background
+
+    def put(self, x, y, text, style=""):
+        if 0 <= y < self.height:
+            row = self.cells[y]
+            for x, char in enumerate(text, start=x):
+                if 0 <= x < self.width:
+                    row[x] = (char, style)
+
+    def box(self, x, y, width, height, title=""):
+        self.put(x, y, "┌" + "─" * (width-2) + "┐")
+        for line in range(y+1, y+height-1):
+            self.put(x, line, "│")
+            self.put(x+width-1, line, "│")
+        self.put(x, y+height-1, "└" + "─" * (width-2) + "┘")
+        if title:
+            self.put(x + (width-len(title)) // 2 + 1, y, title, BOLD)
+
+    def flush(self):
+        """ANSI escape sequences drawing the cells changed since the last flush"""
+        out = []
+        style = None
+        cursor = None
+        for y, (row, sent) in enumerate(zip(self.cells, self.sent)):
+            if row == sent:
+                continue
+            for x, cell in enumerate(row):
+                if cell == sent[x]:
+                    continue
+                char, cell_style = cell
+                if cursor != (x, y):
+                    out.append("\x1b[%d;%dH" % (y+1, x+1))
+                if cell_style != style:
+                    out.append("\x1b[0;%sm" % cell_style if cell_style else "\x1b[0m")
+                    style = cell_style
+                out.append(char)
+                sent[x] = cell
+                cursor = (x+1, y)
+        if out and style:
+            out.append("\x1b[0m")
+        return "".join(out).encode("utf-8")
+
+
+class Display:
+    """Layout of the curses frontend drawn on a Screen from a broadcast.view
+
+    The panel under NEXT shows title and lines.
+    """
+
+    WIDTH = 80
+    HOLD_HEIGHT = 6
+    PIECE_POSITION = Point(6, 3)
+    MINO = "██"
+    GHOST = "░░"
+
+    def __init__(self, nb_cols, nb_lines, title, lines):
+        self.nb_cols = nb_cols
+        self.nb_lines = nb_lines
+        self.matrix_width = nb_cols*2 + 2
+        self.height = nb_lines + 1
+        self.side_width = (self.WIDTH - self.matrix_width) // 2 - 1
+        self.matrix_x = self.side_width + 1
+        self.right_x = self.matrix_x + self.matrix_width + 1
+        self.screen = Screen(self.WIDTH, self.height)
+        self.draw_background(title, lines)
+
+    def draw_background(self, title, lines):
+        """Draw the frames and the panel once, as they never change"""
+        screen = self.screen
+        screen.box(self.matrix_x, 0, self.matrix_width, self.height)
+        screen.box(0, 0, self.side_width, self.HOLD_HEIGHT, "HOLD")
+        screen.box(self.right_x, 0, self.side_width, self.HOLD_HEIGHT, "NEXT")
+        screen.box(0, self.HOLD_HEIGHT, self.side_width, self.height - self.HOLD_HEIGHT, "STATS")
+        screen.box(self.right_x, self.HOLD_HEIGHT, self.side_width, self.height - self.HOLD_HEIGHT, title)
+        for y, line in enumerate(lines, start=self.HOLD_HEIGHT+2):
+            screen.put(self.right_x+2, y, line)
+        screen.set_background()
+
+    def draw(self, cells, fields):
+        """ANSI escape sequences updating the terminal to this view"""
+        self.screen.clear()
+        self.draw_matrix(cells, fields)
+        if not fields["paused"]:
+            self.draw_piece(0, fields["hold"])
+            self.draw_piece(self.right_x, fields["next"])
+        self.draw_stats(fields)
+        return self.screen.flush()
+
+    def draw_mino(self, left, x, y, glyph, style):
+        if y >= 0:
+            self.screen.put(left + x*2+1, y, glyph, style)
+
+    def draw_matrix(self, cells, fields):
+        screen = self.screen
+        x0 = self.matrix_x
+        if fields["paused"]:
+            screen.put(x0 + self.nb_cols-1, self.nb_lines//2 + 1, "PAUSE", BOLD)
+            return
+        for i, code in enumerate(cells):
+            if code:
+                y, x = divmod(i, self.nb_cols)
+                style = COLORS[Engine.TETROMINOES[(code & 7) - 1]]
+                if code & broadcast.GHOST:
+                    self.draw_mino(x0, x, y, self.GHOST, style + ";" + DIM)
+                elif code & broadcast.LOCKING:
+                    self.draw_mino(x0, x, y, self.MINO, style + ";" + BLINK)
+                else:
+                    self.draw_mino(x0, x, y, self.MINO, style)
+        if fields["over"]:
+            for y, word in enumerate(("GAME", "OVER"), start=self.nb_lines//2):
+                screen.put(x0 + self.nb_cols-1, y, word, BOLD + ";7")
+
+    def draw_piece(self, x0, code):
+        if code:
+            tetromino_class = Engine.TETROMINOES[code-1]
+            for mino_position in tetromino_class.MINOES_POSITIONS:
+                self.draw_mino(
+                    x0,
+                    self.PIECE_POSITION.x + mino_position.x, self.PIECE_POSITION.y + mino_position.y,
+                    self.MINO, COLORS[tetromino_class]
+                )
+
+    def draw_stats(self, fields):
+        top = self.HOLD_HEIGHT
+        for y, (name, value) in enumerate((
+            ("SCORE", "{:n}".format(fields["score"])),
+            ("HIGH", "{:n}".format(fields["high"])),
+            ("TIME", format_time(fields["time"])),
+            ("LEVEL", "%d" % fields["level"]),
+            ("GOAL", "%d" % fields["goal"]),
+            ("LINES", "%d" % fields["cleared"])
+        ), start=top+2):
+            style = BOLD + ";5" if name == "HIGH" and fields["score"] >= fields["high"] else ""
+            self.screen.put(2, y, name.ljust(8) + value, style)
+        start_y = self.height - len(fields["strings"]) - 2
+        for y, string in enumerate(fields["strings"], start=start_y):
+            self.screen.put((self.side_width-len(string)) // 2 + 1, y, string)
+
+
+class Session:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.engine = Engine(level=server.level, high_score=server.high_score)
+        if server.event_log:
+            peer = writer.get_extra_info("peername")
+            server.event_log.observe(self.engine, user=str(peer[0]) if peer else "?", level=server.level)
+        self.display = Display(
+            self.engine.matrix.nb_cols, self.engine.matrix.nb_lines,
+            "CONTROLS", [name.ljust(8) + action for action, key, name in CONTROLS]
+        )
+        self.pending = b""
+        self.actions = dict((key, action) for action, key, name in CONTROLS)
+        self.loop = asyncio.get_event_loop()
+        self.last_step = self.loop.time()
+
+    async def run(self):
+        self.writer.write(NEGOTIATION + b"\x1b[?25l\x1b[2J")
+        self.draw()
+        try:
+            while True:
+                timeout = self.next_deadline()
+                try:
+                    data = await asyncio.wait_for(self.reader.read(64), timeout)
+                except asyncio.TimeoutError:
+                    data = None
+                else:
+                    if not data:
+                        break
+                events = self.play(None)
+                for key in self.keys(data or b""):
+                    action = self.actions.get(key)
+                    if action == "QUIT":
+                        return
+                    events += self.play(action)
+                if events or not self.engine.paused:
+                    self.draw()
+                await self.writer.drain()
+        finally:
+            self.close()
+
+    def next_deadline(self):
+        """Seconds until the next engine event or the next second of the game clock, None if idle"""
+        if self.engine.paused or self.engine.game_over:
+            return None
+        delays = [1 - self.engine.time % 1]
+        delay = self.engine.next_event_delay()
+        if delay is not None:
+            delays.append(delay)
+        return max(0, min(delays))
+
+    def play(self, action):
+        now = self.loop.time()
+        events = self.engine.step(action, now - self.last_step)
+        self.last_step = now
+        if self.engine.stats.high_score > self.server.high_score:
+            self.server.high_score = self.engine.stats.high_score
+        return events
+
+    def keys(self, data):
+        """Keys in the received data, following the key names of CONTROLS"""
+        data = self.pending + data
+        keys = []
+        i = 0
+        while i < len(data):
+            byte = data[i]
+            if byte == IAC:
+                if i+1 == len(data):
+                    break
+                command = data[i+1]
+                if command in (WILL, WONT, DO, DONT):
+                    if i+2 == len(data):
+                        break
+                    i += 3
+                elif command == SB:
+                    end = data.find(bytes((IAC, SE)), i)
+                    if end < 0:
+                        break
+                    i = end + 2
+                else:
+                    i += 2
+            elif byte == 0x1b:
+                sequence = data[i:i+3]
+                if len(sequence) < 3 and any(known.startswith(sequence) for known in ESCAPE_SEQUENCES):
+                    break
+                if sequence in ESCAPE_SEQUENCES:
+                    keys.append(ESCAPE_SEQUENCES[sequence])
+                    i += 3
+                else:
+                    i += 1
+            elif byte == 0x0d:
+                # Telnet sends Enter as CR LF or CR NUL
+                keys.append("\n")
+                i += 2 if data[i+1:i+2] in (b"\n", b"\0") else 1
+            else:
+                keys.append(chr(byte))
+                i += 1
+        self.pending = data[i:][-16:]
+        return keys
+
+    def draw(self):
+        self.writer.write(self.display.draw(*broadcast.view(self.engine)))
+
+    def close(self):
+        self.server.sessions.discard(self)
+        if self.server.event_log and not self.engine.game_over:
+            self.engine.observer.record("quit")
+        try:
+            self.writer.write(
+                ("\x1b[0m\x1b[%d;1H\x1b[?25h\r\n" % (self.display.height+1)).encode("utf-8")
+                + summary(self.engine).replace("\n", "\r\n").encode("utf-8") + b"\r\n"
+            )
+            self.writer.close()
+        except (ConnectionError, RuntimeError):
+            pass
+
+
+class Server:
+    """Sessions of the connected players, sharing a high score"""
+
+    def __init__(self, level=1, event_log=None):
+        self.level = level
+        self.event_log = event_log
+        self.high_score = 0
+        self.sessions = set()
+
+    async def handle(self, reader, writer):
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        try:
+            await session.run()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        for sock in server.sockets:
+            print("Serving terminis on %s:%d" % sock.getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+
+def parse_address(address):
+    host, sep, port = address.rpartition(":")
+    return host.strip("[]") or None, int(port)
+
+
+def main(address, level=1, event_log_path=None):
+    try:
+        host, port = parse_address(address)
+    except ValueError:
+        sys.exit("Invalid address %s: expected HOST:PORT" % address)
+    if event_log_path:
+        from . import eventlog
+        try:
+            event_log = eventlog.EventLog(event_log_path)
+        except OSError as e:
+            sys.exit("Could not log events into %s: %s" % (event_log_path, e))
+    else:
+        event_log = None
+    try:
+        asyncio.run(Server(level, event_log).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if event_log:
+            error = event_log.close()
+            if error:
+                print("Events could not be logged: %s" % error)
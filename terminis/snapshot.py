@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+"""Game state saved to disk and restored, to suspend and resume games
+
+A snapshot holds all an Engine needs to go on exactly where it stopped:
+matrix cells, active piece with its orientation and rotation flags, hold and
+next pieces, 7-bag and random generator state, stats, game time and the time
+left before gravity and lock delay. It is a HEADER followed by this state
+marshalled, about 3 kB written or read in a fraction of a millisecond.
+
+Each game has its own Slot, a snapshot file named after its seed, so that
+games played at the same time in several terminals do not overwrite each
+other. The process playing a game holds a lock on the lock file of its
+slot, and a slot is only resumed or discarded by the process which gets
+this lock, never while its game is still played elsewhere.
+"""
+
+import os
+import array
+import marshal
+import struct
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+from .engine import Engine, Point
+
+
+MAGIC = b"TRSN"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+# Codes of tetrominoes: 1 + index of their class in Engine.TETROMINOES, 0 for none
+CODES = dict((tetromino_class, code) for code, tetromino_class in enumerate(Engine.TETROMINOES, start=1))
+
+
+SUFFIX = ".snapshot"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def piece_state(piece):
+    if piece is None:
+        return None
+    return (
+        CODES[piece.__class__], piece.position.x, piece.position.y, piece.orientation,
+        piece.rotation_point_5_used, piece.rotated_last, piece.hold_enabled
+    )
+
+
+def restore_piece(engine, state):
+    if state is None:
+        return None
+    code, x, y, orientation, rotation_point_5_used, rotated_last, hold_enabled = state
+    piece = Engine.TETROMINOES[code-1](engine.matrix, Point(x, y))
+    piece.orientation = orientation
+    piece.minoes_positions = piece.ORIENTATIONS[orientation]
+    piece.masks = piece.MASKS[orientation]
+    piece.rotation_point_5_used = rotation_point_5_used
+    piece.rotated_last = rotated_last
+    piece.hold_enabled = hold_enabled
+    return piece
+
+
+def dumps(engine):
+    matrix = engine.matrix
+    stats = engine.stats
+    scheduler = engine.scheduler
+    random_version, random_key, gauss_next = engine.random.getstate()
+    state = {
+        "seed": engine.seed,
+        "random": (random_version, array.array("I", random_key).tobytes(), gauss_next),
+        "bag": bytes(bytearray(CODES[tetromino_class] for tetromino_class in engine.random_bag)),
+        "time": engine.time,
+        "paused": engine.paused,
+        "over": engine.game_over,
+        "cols": matrix.nb_cols,
+        "lines": matrix.nb_lines,
+        "cells": bytes(bytearray(
+            0 if tetromino_class is None else CODES[tetromino_class]
+            for line in matrix.cells
+            for tetromino_class in line
+        )),
+        "piece": piece_state(matrix.piece),
+        "hold": piece_state(engine.hold_piece),
+        "next": piece_state(engine.next_piece),
+        "stats": (
+            stats.level, stats.goal, stats.score, stats.high_score, stats.combo,
+            stats.lines_cleared, stats.strings, stats.fall_delay, stats.lock_delay
+        ),
+        # Game time left before each job
+        "jobs": dict((name, event.time - engine.time) for name, event in scheduler.items())
+    }
+    return HEADER.pack(MAGIC, VERSION) + marshal.dumps(state)
+
+
+def loads(data):
+    """Engine in the state snapshot data was taken of, raise SnapshotError if it is invalid"""
+    if data[:HEADER.size] != HEADER.pack(MAGIC, VERSION):
+        raise SnapshotError("not a Terminis snapshot")
+    try:
+        state = marshal.loads(data[HEADER.size:])
+        engine = Engine(seed=state["seed"], nb_cols=state["cols"], nb_lines=state["lines"])
+        engine.scheduler.cancel("fall")
+        engine.scheduler.cancel("lock")
+        engine.events = []
+
+        random_version, random_key, gauss_next = state["random"]
+        engine.random.setstate((random_version, tuple(array.array("I", random_key)), gauss_next))
+        engine.random_bag = [Engine.TETROMINOES[code-1] for code in bytearray(state["bag"])]
+        engine.time = state["time"]
+        engine.paused = state["paused"]
+        engine.game_over = state["over"]
+
+        matrix = engine.matrix
+        cells = bytearray(state["cells"])
+        if len(cells) != matrix.nb_cols * matrix.nb_lines:
+            raise ValueError("wrong number of cells")
+        for y in range(matrix.nb_lines):
+            line = matrix.empty_line
+            for x in range(matrix.nb_cols):
+                code = cells[y*matrix.nb_cols + x]
+                if code:
+                    matrix.cells[y][x] = Engine.TETROMINOES[code-1]
+                    line |= 1 << x+2
+            matrix.lines[y] = line
+        matrix.update_heights()
+        matrix.piece = restore_piece(engine, state["piece"])
+        engine.hold_piece = restore_piece(engine, state["hold"])
+        engine.next_piece = restore_piece(engine, state["next"])
+
+        stats = engine.stats
+        (
+            stats.level, stats.goal, stats.score, stats.high_score, stats.combo,
+            stats.lines_cleared, stats.strings, stats.fall_delay, stats.lock_delay
+        ) = state["stats"]
+        stats.update_gravity()
+
+        jobs = state["jobs"]
+        if "fall" in jobs:
+            engine.scheduler.repeat("fall", stats.fall_period, matrix.piece.fall, first_delay=jobs["fall"])
+        if "lock" in jobs:
+            engine.scheduler.single_shot("lock", jobs["lock"], matrix.lock)
+    except (EOFError, ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+        raise SnapshotError("invalid snapshot: %s" % e)
+    return engine
+
+
+def save(engine, path):
+    """Write a snapshot of engine into path, replacing it at once"""
+    dir_path = os.path.dirname(path)
+    if dir_path and not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    temp_path = "%s.%d" % (path, os.getpid())
+    with open(temp_path, "wb") as f:
+        f.write(dumps(engine))
+    os.replace(temp_path, path)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class Slot:
+    """Snapshot file of a game, owned by the process playing it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.lock = None
+
+    @classmethod
+    def of(cls, engine, dir_path):
+        return cls(os.path.join(dir_path, "game-%016x%s" % (engine.seed, SUFFIX)))
+
+    def acquire(self):
+        """Own the slot, return False if another process does"""
+        dir_path = os.path.dirname(self.path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.lock = open(self.lock_path, "a")
+        if fcntl:
+            try:
+                fcntl.flock(self.lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.lock.close()
+                self.lock = None
+                return False
+        return True
+
+    def save(self, engine):
+        if self.lock is None and not self.acquire():
+            raise SnapshotError("%s is used by another game" % self.path)
+        save(engine, self.path)
+
+    def load(self):
+        return load(self.path)
+
+    def release(self, remove=False):
+        """Give up the slot, removing its files if remove"""
+        if remove:
+            for path in (self.path, self.lock_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if self.lock:
+            self.lock.close()
+            self.lock = None
+
+
+def suspended(dir_path):
+    """Slots of the snapshots in dir_path, most recent first, owned or not"""
+    try:
+        names = [name for name in os.listdir(dir_path) if name.endswith(SUFFIX)]
+    except OSError:
+        return []
+    paths = []
+    for name in names:
+        path = os.path.join(dir_path, name)
+        try:
+            paths.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    return [Slot(path) for mtime, path in sorted(paths, reverse=True)]
+
+
+def take(dir_path):
+    """(slot, engine) of the most recent game suspended in dir_path and owned by no process, or None"""
+    for slot in suspended(dir_path):
+        if not slot.acquire():
+            continue
+        try:
+            return slot, slot.load()
+        except IOError:
+            # Discarded since it was listed
+            slot.release(remove=True)
+        except SnapshotError:
+            slot.release()
+    return None
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""Line clear sequences for the pieces to come: perfect clears and T-spins
+
+terminis --solve[=seconds]
+
+Solver searches, over the current piece, the hold piece and the queue the
+7-bag makes known (the next piece, then the rest of its bag), the sequence
+of placements scoring the most: the Stats.SCORES of each clear, T-spins
+included, plus PERFECT_CLEAR for a perfect clear, which ends the sequence.
+Placements are those of Bot.placements, reached with the SRS kicks and
+rated with the T-spin rules of the engine, and the boards left at the end
+are ranked by Bot.evaluate.
+
+The search deepens one piece at a time until its time budget runs out, and
+keeps the sequence of the deepest search completed. The budget counts from
+the start of the search, and is checked for each position and placement. Placements are tried
+best first: the one the transposition table remembers, then by points and
+evaluation, and only the BRANCHING best are searched deeper. The
+transposition table has TABLE_SIZE slots indexed by a hash of the board
+lines, the pieces to come and the hold piece; a position replaces the one
+in its slot unless that one was searched deeper.
+"""
+
+import sys
+import time
+
+from .bot import Bot, Timeout
+from .engine import Engine, Matrix, Rotation, Stats
+
+
+class Step:
+    """Placement of a piece in a solution"""
+
+    def __init__(self, tetromino_class, held, state, t_spin, nb_lines, perfect_clear):
+        self.tetromino_class = tetromino_class
+        self.held = held
+        # (x, y, orientation, rotated_last, rotation_point_5_used)
+        self.state = state
+        self.t_spin = t_spin
+        self.nb_lines = nb_lines
+        self.perfect_clear = perfect_clear
+
+    def cells(self):
+        """(x, y) of the minoes once the piece is locked"""
+        x, y, orientation = self.state[:3]
+        return [
+            (x+mino_position.x, y+mino_position.y)
+            for mino_position in self.tetromino_class.ORIENTATIONS[orientation]
+        ]
+
+    def name(self):
+        """What the placement scores, "" if nothing"""
+        words = []
+        if self.t_spin:
+            words.append(self.t_spin)
+        if self.nb_lines:
+            words.append(Stats.SCORES[self.nb_lines]["name"])
+        if self.perfect_clear:
+            words.append("PERFECT CLEAR")
+        return " ".join(words)
+
+
+class Solver:
+    # Bonus of a perfect clear, in Stats.SCORES units
+    PERFECT_CLEAR = 20
+    # Weight of Bot.evaluate of the boards left at the end of a sequence
+    LEAF_WEIGHT = 0.1
+    # Placements searched deeper from each position
+    BRANCHING = 6
+    TABLE_SIZE = 1 << 16
+    LOCK_OUT = float("-inf")
+
+    def __init__(self, bot=None):
+        self.bot = bot or Bot()
+        self.table = [None] * self.TABLE_SIZE
+        self.nb_positions = 0
+
+    def solve(self, engine, budget):
+        """(value, steps) of the best sequence found within budget seconds
+
+        None if there is none, or if the budget ran out before the search
+        one piece deep was completed.
+        """
+        matrix = engine.matrix
+        piece = matrix.piece
+        self.template = matrix
+        self.queue = (piece.__class__, engine.next_piece.__class__) + tuple(
+            tetromino_class for tetromino_class in reversed(engine.random_bag)
+        )
+        self.root = (
+            (piece.position.x, piece.position.y, piece.orientation, piece.rotation_point_5_used),
+            piece.hold_enabled
+        )
+        hold = engine.hold_piece.__class__ if engine.hold_piece else None
+        lines = tuple(matrix.lines)
+        self.nb_positions = 0
+        self.depth = 0
+        self.deadline = time.perf_counter() + budget
+        best = None
+        for depth in range(1, len(self.queue)+1):
+            try:
+                value, steps = self.search(lines, 0, hold, depth)
+            except Timeout:
+                break
+            if not steps:
+                break
+            self.depth = depth
+            best = (value, steps)
+            if steps[-1].perfect_clear:
+                break
+        return best
+
+    def board(self, lines):
+        """Matrix holding lines, without cells, to search placements on"""
+        return Matrix.from_lines(lines, self.template.nb_cols)
+
+    def children(self, board, index, hold):
+        """(points, evaluation, lines, index, hold, step) of each placement"""
+        first = index == 0
+        current = self.queue[index]
+        options = [(current, False, index+1, hold)]
+        if not first or self.root[1]:
+            if hold is None:
+                if index+1 < len(self.queue):
+                    options.append((self.queue[index+1], True, index+2, current))
+            elif hold is not current:
+                options.append((hold, True, index+1, current))
+
+        # Tucks and spins need overhangs to go under
+        covered = overhangs = 0
+        for line in board.lines:
+            overhangs |= covered & ~line
+            covered |= line
+        children = []
+        for tetromino_class, held, next_index, next_hold in options:
+            if time.perf_counter() > self.deadline:
+                raise Timeout()
+            if first and not held:
+                x, y, orientation, rotation_point_5_used = self.root[0]
+            else:
+                x = board.piece_position.x
+                y = board.piece_position.y + 1
+                orientation, rotation_point_5_used = 0, False
+                if not board.is_free_piece(x, y, tetromino_class.MASKS[0]):
+                    continue
+            if overhangs:
+                placements = self.bot.placements(board, tetromino_class, x, y, orientation, rotation_point_5_used, self.deadline)
+            else:
+                placements = self.drops(board, tetromino_class, x, y, orientation)
+            locked = set()
+            for state, depth in sorted(placements.items(), key=lambda item: item[1]):
+                if time.perf_counter() > self.deadline:
+                    raise Timeout()
+                x, y, orientation, rotated_last, point_5 = state
+                t_spin = self.bot.t_spin(board, tetromino_class, x, y, orientation, rotated_last, point_5)
+                minoes_masks = tuple((y+dy, mask << x) for dy, mask in tetromino_class.MASKS[orientation])
+                if (minoes_masks, t_spin) in locked:
+                    continue
+                locked.add((minoes_masks, t_spin))
+                lines = list(board.lines)
+                for mino_y, mask in minoes_masks:
+                    if mino_y < 0:
+                        break
+                    lines[mino_y] |= mask
+                else:
+                    remaining = [line for line in lines if line != board.full_line]
+                    nb_lines = len(lines) - len(remaining)
+                    lines = tuple([board.empty_line] * nb_lines + remaining)
+                    perfect_clear = bool(nb_lines) and all(line == board.empty_line for line in remaining)
+                    scores = Stats.SCORES[nb_lines]
+                    points = scores.get(t_spin, scores[""])
+                    if perfect_clear:
+                        points += self.PERFECT_CLEAR
+                    evaluation = self.bot.evaluate(board, minoes_masks, t_spin)
+                    step = Step(tetromino_class, held, state, t_spin, nb_lines, perfect_clear)
+                    children.append((points, evaluation, lines, next_index, next_hold, step))
+        return children
+
+    def drops(self, board, tetromino_class, x, y, orientation):
+        """Placements of a piece rotated and moved where it is, then dropped
+
+        Like Bot.placements, less the tucks, which a matrix without
+        overhangs has no use of.
+        """
+        placements = {}
+        for nb_rotations, direction in ((0, 0), (1, Rotation.CLOCKWISE), (2, Rotation.CLOCKWISE), (1, Rotation.COUNTERCLOCKWISE)):
+            rotated_x, rotated_y, rotated_orientation = x, y, orientation
+            for rotation in range(nb_rotations):
+                next_orientation = (rotated_orientation+direction) % 4
+                for dx, dy in tetromino_class.KICKS[rotated_orientation][direction] if tetromino_class.KICKS else ():
+                    if board.is_free_piece(rotated_x+dx, rotated_y+dy, tetromino_class.MASKS[next_orientation]):
+                        rotated_x += dx
+                        rotated_y += dy
+                        rotated_orientation = next_orientation
+                        break
+                else:
+                    break
+            else:
+                masks = tetromino_class.MASKS[rotated_orientation]
+                bottoms = tetromino_class.BOTTOMS[rotated_orientation]
+                for dx in (-1, 1):
+                    moved_x = rotated_x if dx < 0 else rotated_x + 1
+                    while board.is_free_piece(moved_x, rotated_y, masks):
+                        distance = board.drop_distance(moved_x, rotated_y, bottoms, masks)
+                        state = (moved_x, rotated_y+distance, rotated_orientation, False, False)
+                        placements.setdefault(state, nb_rotations + abs(moved_x-rotated_x))
+                        moved_x += dx
+        return placements
+
+    def search(self, lines, index, hold, depth):
+        """(value, steps) of the best sequence of at most depth placements from this position"""
+        if time.perf_counter() > self.deadline:
+            raise Timeout()
+        self.nb_positions += 1
+
+        # The first piece is where it is, the next ones spawn
+        key = (lines, self.queue[index:], hold, None if index else self.root)
+        slot = hash(key) % self.TABLE_SIZE
+        entry = self.table[slot]
+        best_lines = None
+        if entry and entry[0] == key:
+            if entry[1] >= depth:
+                return entry[2], entry[3]
+            best_lines = entry[4]
+
+        children = self.children(self.board(lines), index, hold)
+        ordered = []
+        for points, evaluation, child_lines, child_index, child_hold, step in children:
+            # Value of the sequence ending with this placement
+            value = points + self.LEAF_WEIGHT * evaluation
+            if step.perfect_clear or child_lines == best_lines:
+                priority = float("inf")
+            else:
+                priority = value
+            ordered.append((priority, value, points, child_lines, child_index, child_hold, step))
+        ordered.sort(key=lambda child: child[0], reverse=True)
+        if depth > 1:
+            ordered = ordered[:self.BRANCHING]
+
+        best = (self.LOCK_OUT, [])
+        best_child_lines = None
+        for priority, value, points, child_lines, child_index, child_hold, step in ordered:
+            if step.perfect_clear:
+                value, steps = points, []
+            elif depth == 1 or child_index >= len(self.queue):
+                steps = []
+            else:
+                value, steps = self.search(child_lines, child_index, child_hold, depth-1)
+                value += points
+            if value > best[0]:
+                best = (value, [step] + steps)
+                best_child_lines = child_lines
+
+        entry = self.table[slot]
+        if entry is None or entry[1] <= depth:
+            self.table[slot] = (key, depth, best[0], best[1], best_child_lines)
+        return best
+
+    def actions(self, engine, steps):
+        """Actions of each step, from the position of engine"""
+        self.template = engine.matrix
+        lines = tuple(engine.matrix.lines)
+        all_actions = []
+        for i, step in enumerate(steps):
+            board = self.board(lines)
+            if i == 0 and not step.held:
+                x, y, orientation, rotation_point_5_used = self.root[0]
+            else:
+                x = board.piece_position.x
+                y = board.piece_position.y + 1
+                orientation, rotation_point_5_used = 0, False
+            self.bot.placements(board, step.tetromino_class, x, y, orientation, rotation_point_5_used)
+            actions = self.bot.actions(step.state)
+            if step.held:
+                actions.insert(0, "HOLD")
+            all_actions.append(actions)
+            x, y, orientation = step.state[:3]
+            lines = list(lines)
+            for dy, mask in step.tetromino_class.MASKS[orientation]:
+                lines[y+dy] |= mask << x
+            remaining = [line for line in lines if line != board.full_line]
+            lines = tuple([board.empty_line] * (len(lines)-len(remaining)) + remaining)
+        return all_actions
+
+
+def main(engine, budget):
+    """Print the best sequence found for the position of engine"""
+    solver = Solver()
+    start = time.perf_counter()
+    solution = solver.solve(engine, budget)
+    seconds = time.perf_counter() - start
+    names = dict((tetromino_class, tetromino_class.__name__) for tetromino_class in Engine.TETROMINOES)
+    print("QUEUE\t%s" % " ".join(names[tetromino_class] for tetromino_class in solver.queue))
+    if engine.hold_piece:
+        print("HOLD\t%s" % names[engine.hold_piece.__class__])
+    if solution is None:
+        sys.exit("No placement found")
+    value, steps = solution
+    for i, (step, actions) in enumerate(zip(steps, solver.actions(engine, steps)), start=1):
+        runs = []
+        for action in actions:
+            if runs and runs[-1][0] == action:
+                runs[-1][1] += 1
+            else:
+                runs.append([action, 1])
+        actions = ", ".join(action if n == 1 else "%s x%d" % (action, n) for action, n in runs)
+        print("%d\t%s\t%s\t%s" % (i, names[step.tetromino_class], actions, step.name()))
+    print("VALUE\t%.2f" % value)
+    print("SEARCH\tdepth %d, %d positions in %.3f s" % (solver.depth, solver.nb_positions, seconds))
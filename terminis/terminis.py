@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import time
+START_TIME = time.perf_counter()
+
 import sys
 import os
-import subprocess
-import psutil
 
 try:
     import curses
@@ -15,18 +16,19 @@ pip install --user windows-curses"""
     )
 else:
     curses.COLOR_ORANGE = curses.COLOR_WHITE
-    
-import random
-import sched
-import time
-import os
+
+import math
 import locale
-import subprocess
+import marshal
+import signal
 
-try:
-    from configparser import ConfigParser
-except ImportError: # Python2
-    from ConfigParser import SafeConfigParser as ConfigParser
+from . import engine
+from . import music
+from . import scores
+from .engine import format_time, summary
+
+# Modules not needed to draw the first frame are imported where they are used
+startup_times = [("imports", time.perf_counter())]
 
 
 DIR_NAME = "Terminis"
@@ -37,225 +39,118 @@ Tetris clone for terminal
   --help\t-h\tshow command usage (this message)
   --edit\t-e\tedit controls in text editor
   --reset\t-r\treset to default controls settings
-  --level=n\t\tstart at level n (integer between 1 and 15)"""
-
-
-class Rotation:
-    CLOCKWISE = 1
-    COUNTERCLOCKWISE = -1
-
-
-class Point:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def __add__(self, other):
-        return Point(self.x+other.x, self.y+other.y)
-
-
-class Movement:
-    LEFT  = Point(-1, 0)
-    RIGHT = Point(1, 0)
-    DOWN  = Point(0, 1)
-
-
-class Scheduler(sched.scheduler, dict):
-    def __init__(self):
-        sched.scheduler.__init__(self, time.time, time.sleep)
-        dict.__init__(self)
-        
-    def repeat(self, name, delay, action, args=tuple()):
-        self[name] = sched.scheduler.enter(self, delay, 1, self._repeat, (name, delay, action, args))
-        
-    def _repeat(self, name, delay, action, args):
-        del(self[name])
-        self.repeat(name, delay, action, args)
-        action(*args)
-        
-    def single_shot(self, name, delay, action, args=tuple()):
-        self[name] = sched.scheduler.enter(self, delay, 1, self._single_shot, (name, action, args))
-        
-    def _single_shot(self, name, action, args):
-        del(self[name])
-        action(*args)
-        
-    def cancel(self, name):
-        if name in self:
-            sched.scheduler.cancel(self, self.pop(name))
-
-scheduler = Scheduler()
-
-
-class Tetromino:
-    SUPER_ROTATION_SYSTEM = (
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, -1), Point(0, 2), Point(1, 2)),
-            Rotation.CLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, -1), Point(0, 2), Point(-1, 2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, 1), Point(0, -2), Point(1, -2)),
-            Rotation.CLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, 1), Point(0, -2), Point(1, -2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, -1), Point(0, 2), Point(-1, 2)),
-            Rotation.CLOCKWISE: (Point(0, 0), Point(1, 0), Point(1, -1), Point(0, 2), Point(1, 2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, 1), Point(0, -2), Point(-1, -2)),
-            Rotation.CLOCKWISE: (Point(0, 0), Point(-1, 0), Point(-1, 1), Point(0, 2), Point(-1, -2))
-        }
-    )
-    lock_delay = 0.5
-    fall_delay = 1
-    color_pair = curses.COLOR_BLACK
-
-    def __init__(self, matrix, position):
-        self.matrix = matrix
-        self.position = position
-        self.minoes_positions = self.MINOES_POSITIONS
-        self.orientation = 0
-        self.rotation_point_5_used = False
-        self.rotated_last = False
-        self.hold_enabled = True
-        
-    def move_rotate(self, movement, minoes_positions):
-        potential_position = self.position + movement
-        if all(
-            self.matrix.is_free_cell(potential_position+mino_position)
-            for mino_position in minoes_positions
-        ):
-            self.position = potential_position
-            if "lock" in scheduler:
-                scheduler.cancel("lock")
-                scheduler.single_shot("lock", self.lock_delay, self.matrix.lock)
-            return True
-        else:
-            return False
-        
-    def move(self, movement, lock=True, refresh=True):
-        if self.move_rotate(movement, self.minoes_positions):
-            self.rotated_last = False
-            if refresh:
-                self.matrix.refresh()
-            return True
-        else:
-            if (
-                lock
-                and movement == Movement.DOWN
-                and "lock" not in scheduler
-            ):
-                scheduler.single_shot("lock", self.lock_delay, self.matrix.lock)
-                self.matrix.refresh()
-            return False
-
-    def rotate(self, direction):
-        rotated_minoes_positions = tuple(
-            Point(-direction*mino_position.y, direction*mino_position.x)
-            for mino_position in self.minoes_positions
-        )
-        for rotation_point, liberty_degree in enumerate(self.SUPER_ROTATION_SYSTEM[self.orientation][direction], start=1):
-            if self.move_rotate(liberty_degree, rotated_minoes_positions):
-                self.minoes_positions = rotated_minoes_positions
-                self.orientation = (self.orientation+direction) % 4
-                self.rotated_last = False
-                if rotation_point == 5:
-                    self.rotation_point_5_used = True
-                self.matrix.refresh()
-                return True
+  --level=n\t\tstart at level n (integer between 1 and 30)
+  --record=FILE\t\trecord the game into FILE
+  --replay=FILE\t\treplay the game recorded in FILE and check its score
+  --resume\t\tresume the last game suspended on quit or hang up, and
+\t\t\tnot played in another terminal. Without it, a new game
+\t\t\tends the games suspended and records their scores
+  --autoplay\t\tlet a bot play, without recording its score nor
+\t\t\tsuspending its game
+  --hints\t\tshow where to place each piece for the best line clears
+  --solve[=seconds]\tsearch for seconds (default 5) the best line clears,
+\t\t\tperfect clears and T-spins, of the last suspended game,
+\t\t\tor of a new one
+  --profile=FILE\t\twrite frame times, input latencies and timer
+\t\t\tlateness into FILE on exit
+  --serve=HOST:PORT\thost games for telnet clients connecting to HOST:PORT
+  --broadcast=ADDRESS\tlet others watch the game on HOST:PORT or Unix socket
+\t\t\tADDRESS
+  --watch=ADDRESS\twatch the game broadcast on ADDRESS
+  --startup-timing\tshow the time taken by each startup step on exit
+  --low-bandwidth[=fps]\tfor slow links: draw with ASCII, without blinking,
+\t\t\tat most fps frames per second (default 10), and show
+\t\t\tthe bytes sent on exit
+  --event-log[=FILE]\tlog each move, rotation, hold, lock, line clear, T-spin,
+\t\t\tcombo, level up and game over as a JSON line into FILE
+\t\t\t(default events.jsonl in the data directory), kept
+\t\t\tunder 16 MB by rotating it into FILE.1 to FILE.5
+\t\t\tWith --serve, log the games of all players
+  --scores[=n]\t\tshow the n best games (default 10, at most 100)
+\t\t\tand your rank
+\t\t\tShare the scores between players by setting the
+\t\t\tTERMINIS_SCORES_DIR environment variable to a directory
+\t\t\tof a group of all of them, with the setgid bit set"""
+
+
+class Compositor:
+    """Windows drawn since the last frame, sent to the terminal at once
+
+    Windows mark themselves dirty once drawn into. flush stages them with
+    noutrefresh and updates the terminal with a single doupdate, so that
+    everything a game step changed costs one write. A window never marked
+    again, such as the controls panel, is never sent again.
+
+    With max_fps, frames are sent at most max_fps times per second, what is
+    drawn in between being merged into the next frame. With count_bytes,
+    the bytes sent are counted, from the bytes the process wrote during
+    each doupdate, as reported by /proc (Linux only).
+    """
+
+    IO_PATH = "/proc/self/io"
+
+    def __init__(self, max_fps=None, count_bytes=False):
+        self.dirty = []
+        self.interval = 1 / max_fps if max_fps else 0
+        self.next_time = 0
+        self.start_time = time.monotonic()
+        self.nb_frames = 0
+        self.nb_bytes = None
+        if count_bytes:
+            try:
+                self.io = open(self.IO_PATH, "rb", buffering=0)
+                self.written()
+            except (IOError, ValueError, IndexError):
+                self.io = None
+            else:
+                self.nb_bytes = 0
+
+    def written(self):
+        """Bytes written by the process so far"""
+        self.io.seek(0)
+        return int(self.io.read().split(b"wchar:")[1].split()[0])
+
+    def mark(self, window):
+        if window not in self.dirty:
+            self.dirty.append(window)
+
+    def flush(self, force=False):
+        """Send the dirty windows, or return the delay before the frame rate cap allows it"""
+        if not self.dirty:
+            return None
+        now = time.monotonic()
+        if now < self.next_time and not force:
+            return self.next_time - now
+        self.next_time = now + self.interval
+        self.nb_frames += 1
+        for window in self.dirty:
+            window.noutrefresh()
+        self.dirty = []
+        if self.nb_bytes is None:
+            curses.doupdate()
         else:
-            return False
-
-    def soft_drop(self):
-        if self.move(Movement.DOWN):
-            self.matrix.game.stats.piece_dropped(1)
-
-    def hard_drop(self):
-        lines = 0
-        while self.move(Movement.DOWN, lock=False, refresh=False):
-            lines += 2
-        self.matrix.refresh()
-        self.matrix.game.stats.piece_dropped(lines)
-        self.matrix.lock()
-        
-    def fall(self):
-        self.move(Movement.DOWN)
-
-    def t_spin(self):
-        return ""
-
-
-class O(Tetromino):
-    SUPER_ROTATION_SYSTEM = tuple()
-    MINOES_POSITIONS = (Point(0, 0), Point(1, 0), Point(0, -1), Point(1, -1))
-    COLOR = curses.COLOR_YELLOW
-
-    def rotate(self, direction):
-        return False
-
-class I(Tetromino):
-    SUPER_ROTATION_SYSTEM = (
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, 1), Point(-1, 1), Point(2, 1), Point(-1, -1), Point(2, 2)),
-            Rotation.CLOCKWISE: (Point(1, 0), Point(-1, 0), Point(2, 0), Point(-1, 1), Point(2, -2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(-1, 0), Point(1, 0), Point(-2, 0), Point(1, -1), Point(-2, 2)),
-            Rotation.CLOCKWISE: (Point(0, 1), Point(-1, 1), Point(2, 1), Point(-1, -1), Point(2, 2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(0, -1), Point(1, -1), Point(-2, -1), Point(1, 1), Point(-2, -2)),
-            Rotation.CLOCKWISE: (Point(-1, 0), Point(1, 0), Point(-2, 0), Point(1, -1), Point(-2, 2)),
-        },
-        {
-            Rotation.COUNTERCLOCKWISE: (Point(1, 0), Point(-1, 0), Point(2, 0), Point(-1, 1), Point(2, -2)),
-            Rotation.CLOCKWISE: (Point(0, 1), Point(1, -1), Point(-2, -1), Point(1, 1), Point(-2, -2)),
-        },
-    )
-    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(1, 0), Point(2, 0))
-    COLOR = curses.COLOR_CYAN
-
-class T(Tetromino):
-    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(0, -1), Point(1, 0))
-    COLOR = curses.COLOR_MAGENTA
-    T_SLOT = (Point(-1, -1), Point(1, -1), Point(1, 1), Point(-1, 1))
-
-    def t_spin(self):
-        if self.rotated_last:
-            a = not self.matrix.is_free_cell(self.position+self.T_SLOT[self.orientation])
-            b = not self.matrix.is_free_cell(self.position+self.T_SLOT[(1+self.orientation)%4])
-            c = not self.matrix.is_free_cell(self.position+self.T_SLOT[(3+self.orientation)%4])
-            d = not self.matrix.is_free_cell(self.position+self.T_SLOT[(2+self.orientation)%4])
-            
-            if self.rotation_point_5_used or (a and b and (c or d)):
-                return "T-SPIN"
-            elif c and d and (a or b):
-                return "MINI T-SPIN"
-        return ""
-
-class L(Tetromino):
-    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(1, 0), Point(1, -1))
-    COLOR = curses.COLOR_ORANGE
+            written = self.written()
+            curses.doupdate()
+            self.nb_bytes += self.written() - written
+        return None
 
-class J(Tetromino):
-    MINOES_POSITIONS = (Point(-1, -1), Point(-1, 0), Point(0, 0), Point(1, 0))
-    COLOR = curses.COLOR_BLUE
-
-class S(Tetromino):
-    MINOES_POSITIONS = (Point(-1, 0), Point(0, 0), Point(0, -1), Point(1, -1))
-    COLOR = curses.COLOR_GREEN
-
-class Z(Tetromino):
-    MINOES_POSITIONS = (Point(-1, -1), Point(0, -1), Point(0, 0), Point(1, 0))
-    COLOR = curses.COLOR_RED
+    def bandwidth(self):
+        """Report of the bytes sent, if they were counted"""
+        if self.nb_bytes is None:
+            return ""
+        seconds = time.monotonic() - self.start_time
+        return "OUTPUT\t{:n} bytes\n\t{:n} B/s".format(self.nb_bytes, int(self.nb_bytes / seconds))
 
 
 class Window:
-    def __init__(self, width, height, begin_x, begin_y):
+    MINO = "██"
+    ASCII_MINO = "[]"
+
+    def __init__(self, compositor, width, height, begin_x, begin_y):
+        self.compositor = compositor
         self.window = curses.newwin(height, width, begin_y, begin_x)
         if self.TITLE:
             self.title_begin_x = (width-len(self.TITLE)) // 2 + 1
-        self.piece = None
         self.refresh()
 
     def draw_border(self):
@@ -264,115 +159,152 @@ class Window:
         if self.TITLE:
             self.window.addstr(0, self.title_begin_x, self.TITLE, curses.A_BOLD)
 
-    def draw_piece(self):
-        if self.piece:
-            if "lock" in scheduler:
-                attr = self.piece.color_pair | curses.A_BLINK | curses.A_REVERSE
-            else:
-                attr = self.piece.color_pair
-            for mino_position in self.piece.minoes_positions:
-                position = mino_position + self.piece.position
-                self.draw_mino(position.x, position.y, attr)
+    def draw_piece(self, piece, position, attr):
+        for mino_position in piece.minoes_positions:
+            self.draw_mino(mino_position.x+position.x, mino_position.y+position.y, attr)
 
     def draw_mino(self, x, y, attr):
         if y >= 0:
-            self.window.addstr(y, x*2+1, "██", attr)
+            self.window.addstr(y, x*2+1, self.MINO, attr)
 
 
 class Matrix(Window):
-    NB_COLS = 10
-    NB_LINES = 21
-    WIDTH = NB_COLS*2+2
-    HEIGHT = NB_LINES+1
-    PIECE_POSITION = Point(4, -1)
+    WIDTH = engine.Matrix.NB_COLS*2+2
+    HEIGHT = engine.Matrix.NB_LINES+1
     TITLE = ""
+    GHOST = "░░"
+    ASCII_GHOST = "::"
+    HINT = "▒▒"
+    ASCII_HINT = "<>"
 
     def __init__(self, game, begin_x, begin_y):
-        begin_x += (game.WIDTH - self.WIDTH) // 2
-        begin_y += (game.HEIGHT - self.HEIGHT) // 2
         self.game = game
-        self.cells = [
-            [None for x in range(self.NB_COLS)]
-            for y in range(self.NB_LINES)
-        ]
-        self.piece = None
-        Window.__init__(self, self.WIDTH, self.HEIGHT, begin_x, begin_y)
+        self.matrix = game.engine.matrix
+        width = self.matrix.nb_cols*2 + 2
+        height = self.matrix.nb_lines + 1
+        begin_x += (game.WIDTH - width) // 2
+        begin_y += (game.HEIGHT - height) // 2
+        self.frame = None
+        if game.low_bandwidth:
+            self.MINO = self.ASCII_MINO
+            self.GHOST = self.ASCII_GHOST
+            self.HINT = self.ASCII_HINT
+        Window.__init__(self, game.compositor, width, height, begin_x, begin_y)
 
     def refresh(self, paused=False):
-        self.draw_border()
         if paused:
-            self.window.addstr(11, 9, "PAUSE", curses.A_BOLD)
+            self.draw_border()
+            self.window.addstr(self.matrix.nb_lines//2 + 1, self.matrix.nb_cols-1, "PAUSE", curses.A_BOLD)
+            self.frame = None
         else:
-            for y, line in enumerate(self.cells):
-                for x, color in enumerate(line):
-                    if color is not None:
-                        self.draw_mino(x, y, color)
-            self.draw_piece()
-        self.window.refresh()
-
-    def is_free_cell(self, position):
-        return (
-            0 <= position.x < self.NB_COLS
-            and position.y < self.NB_LINES
-            and not (position.y >= 0 and self.cells[position.y][position.x] is not None)
-        )
-
-    def lock(self):
-        if not self.piece.move(Movement.DOWN):
-            scheduler.cancel("fall")
-            
-            t_spin = self.piece.t_spin()
-            
-            for mino_position in self.piece.minoes_positions:
-                position = mino_position + self.piece.position
-                if position.y >= 0:
-                    self.cells[position.y][position.x] = self.piece.color_pair
-                else:
-                    self.game.over()
-                    return
-    
-            nb_lines_cleared = 0
-            for y, line in enumerate(self.cells):
-                if all(mino for mino in line):
-                    self.cells.pop(y)
-                    self.cells.insert(0, [None for x in range(self.NB_COLS)])
-                    nb_lines_cleared += 1
-                    
-            self.game.stats.piece_locked(nb_lines_cleared, t_spin)
-            self.piece = None
-            self.game.new_piece()
+            if self.frame is None:
+                self.draw_border()
+                # Last drawn (glyph, attribute) of each cell (None if
+                # empty), last drawn matrix cells of each line and lines of
+                # the last drawn piece and ghost, to redraw only what changed.
+                self.frame = [[None for x in range(self.matrix.nb_cols)] for y in range(self.matrix.nb_lines)]
+                self.frame_cells = [tuple(line) for line in self.frame]
+                self.frame_piece_lines = set()
+            self.draw_changes()
+        self.compositor.mark(self.window)
+
+    def draw_changes(self):
+        piece_cells = {}
+        if self.game.hint:
+            tetromino_class, cells = self.game.hint
+            attr = self.game.color_pairs[tetromino_class] | curses.A_DIM
+            for x, y in cells:
+                if y >= 0:
+                    piece_cells.setdefault(y, {})[x] = (self.HINT, attr)
+        piece = self.matrix.piece
+        if piece:
+            attr = self.game.color_pairs[piece.__class__]
+            ghost_y = piece.position.y + piece.drop_distance()
+            for mino_position in piece.minoes_positions:
+                y = mino_position.y + ghost_y
+                if y >= 0:
+                    piece_cells.setdefault(y, {})[mino_position.x+piece.position.x] = (self.GHOST, attr|curses.A_DIM)
+            if "lock" in self.game.engine.scheduler:
+                attr |= self.game.blink | curses.A_REVERSE
+            for mino_position in piece.minoes_positions:
+                y = mino_position.y + piece.position.y
+                if y >= 0:
+                    piece_cells.setdefault(y, {})[mino_position.x+piece.position.x] = (self.MINO, attr)
+
+        changed_lines = self.frame_piece_lines | set(piece_cells)
+        for y, cells in enumerate(self.matrix.cells):
+            cells = tuple(cells)
+            if cells != self.frame_cells[y]:
+                self.frame_cells[y] = cells
+                changed_lines.add(y)
+        self.frame_piece_lines = set(piece_cells)
+
+        for y in changed_lines:
+            line = [
+                None if tetromino_class is None else (self.MINO, self.game.color_pairs[tetromino_class])
+                for tetromino_class in self.frame_cells[y]
+            ]
+            for x, cell in piece_cells.get(y, {}).items():
+                line[x] = cell
+            self.draw_line(y, line)
+
+    def draw_line(self, y, line):
+        """Draw each run of changed cells of the same glyph and attribute at once"""
+        drawn = self.frame[y]
+        x = 0
+        while x < len(line):
+            cell = line[x]
+            if cell == drawn[x]:
+                x += 1
+                continue
+            begin_x = x
+            while x < len(line) and line[x] == cell and line[x] != drawn[x]:
+                drawn[x] = cell
+                x += 1
+            width = 2 * (x-begin_x)
+            if cell is not None:
+                glyph, attr = cell
+                self.window.addstr(y, begin_x*2+1, glyph * (x-begin_x), attr)
+            elif y == 0:
+                self.window.hline(y, begin_x*2+1, curses.ACS_HLINE, width)
+            else:
+                self.window.addstr(y, begin_x*2+1, " " * width)
 
 
 class HoldNext(Window):
     HEIGHT = 6
-    PIECE_POSITION = Point(6, 3)
+    PIECE_POSITION = engine.Point(6, 3)
 
-    def __init__(self, width, begin_x, begin_y):
-        Window.__init__(self, width, self.HEIGHT, begin_x, begin_y)
+    def __init__(self, game, width, begin_x, begin_y):
+        self.game = game
+        if game.low_bandwidth:
+            self.MINO = self.ASCII_MINO
+        Window.__init__(self, game.compositor, width, self.HEIGHT, begin_x, begin_y)
 
     def refresh(self, paused=False):
         self.draw_border()
-        if not paused:
-            self.draw_piece()
-        self.window.refresh()
+        if self.piece and not paused:
+            self.draw_piece(self.piece, self.PIECE_POSITION, self.game.color_pairs[self.piece.__class__])
+        self.compositor.mark(self.window)
 
 
 class Hold(HoldNext):
     TITLE = "HOLD"
 
+    @property
+    def piece(self):
+        return self.game.engine.hold_piece
+
 
 class Next(HoldNext):
     TITLE = "NEXT"
 
+    @property
+    def piece(self):
+        return self.game.engine.next_piece
+
 
 class Stats(Window):
-    SCORES = (
-        {"name": "", "": 0, "MINI T-SPIN": 1, "T-SPIN": 4},
-        {"name": "SINGLE", "": 1, "MINI T-SPIN": 2, "T-SPIN": 8},
-        {"name": "DOUBLE", "": 3, "T-SPIN": 12},
-        {"name": "TRIPLE", "": 5, "T-SPIN": 16},
-        {"name": "TETRIS", "": 8}
-    )
     TITLE = "STATS"
     FILE_NAME = ".high_score"
     if sys.platform == "win32":
@@ -381,135 +313,100 @@ class Stats(Window):
         DIR_PATH = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
     DIR_PATH = os.path.join(DIR_PATH, DIR_NAME)
     FILE_PATH = os.path.join(DIR_PATH, FILE_NAME)
+    SCORES_DIR_PATH = os.environ.get("TERMINIS_SCORES_DIR", DIR_PATH)
 
     def __init__(self, game, width, height, begin_x, begin_y):
-        for arg in sys.argv[1:]:
-            if arg.startswith("--level="):
-                try:
-                    self.level = int(arg[8:])
-                except ValueError:
-                    sys.exit(HELP_MSG)
-                else:
-                    self.level = max(1, self.level)
-                    self.level = min(15, self.level)
-                    self.level -= 1
-                    break
-        else:
-            self.level = 0
-
         self.game = game
+        self.stats = game.engine.stats
         self.width = width
         self.height = height
-        self.goal = 0
-        self.score = 0
+        Window.__init__(self, game.compositor, width, height, begin_x, begin_y)
+
+    @classmethod
+    def leaderboard(cls):
+        return scores.Leaderboard(cls.SCORES_DIR_PATH)
+
+    @classmethod
+    def load_high_score(cls):
+        """Best score of the leaderboard, or of the high score file of older versions"""
         try:
-            with open(self.FILE_PATH, "r") as f:
-               self.high_score = int(f.read())
-        except:
-            self.high_score = 0
-        self.combo = -1
-        self.time = time.time()
-        self.lines_cleared = 0
-        self.strings = []
-        Window.__init__(self, width, height, begin_x, begin_y)
-        self.new_level()
+            with open(cls.FILE_PATH, "r") as f:
+               high_score = int(f.read())
+        except (IOError, ValueError):
+            high_score = 0
+        return max(high_score, cls.leaderboard().high_score())
 
     def refresh(self):
         self.draw_border()
-        self.window.addstr(2, 2, "SCORE\t{:n}".format(self.score))
-        if self.score >= self.high_score:
-            self.window.addstr(3, 2, "HIGH\t{:n}".format(self.high_score), curses.A_BLINK|curses.A_BOLD)
+        self.window.addstr(2, 2, "SCORE\t{:n}".format(self.stats.score))
+        if self.stats.score >= self.stats.high_score:
+            self.window.addstr(3, 2, "HIGH\t{:n}".format(self.stats.high_score), self.game.blink|curses.A_BOLD)
         else:
-            self.window.addstr(3, 2, "HIGH\t{:n}".format(self.high_score))
-        self.window.addstr(5, 2, "LEVEL\t%d" % self.level)
-        self.window.addstr(6, 2, "GOAL\t%d" % self.goal)
-        self.window.addstr(7, 2, "LINES\t%d" % self.lines_cleared)
-        start_y = self.height - len(self.strings) - 2
-        for y, string in enumerate(self.strings, start=start_y):
+            self.window.addstr(3, 2, "HIGH\t{:n}".format(self.stats.high_score))
+        self.window.addstr(5, 2, "LEVEL\t%d" % self.stats.level)
+        self.window.addstr(6, 2, "GOAL\t%d" % self.stats.goal)
+        self.window.addstr(7, 2, "LINES\t%d" % self.stats.lines_cleared)
+        start_y = self.height - len(self.stats.strings) - 2
+        for y, string in enumerate(self.stats.strings, start=start_y):
             x = (self.width-len(string)) // 2 + 1
             self.window.addstr(y, x, string)
         self.refresh_time()
         
     def refresh_time(self):
-        t = time.localtime(time.time() - self.time)
-        self.window.addstr(4, 2, "TIME\t%02d:%02d:%02d" % (t.tm_hour-1, t.tm_min, t.tm_sec))
-        self.window.refresh()
-
-    def new_level(self):
-        self.level += 1
-        if self.level <= 20:
-            Tetromino.fall_delay = pow(0.8 - ((self.level-1)*0.007), self.level-1)
-        if self.level > 15:
-            Tetromino.lock_delay = 0.5 * pow(0.9, self.level-15)
-        self.goal += 5 * self.level
-        self.refresh()
-
-    def piece_dropped(self, lines):
-        self.score += lines
-        if self.score > self.high_score:
-            self.high_score = self.score
-        self.refresh()
-
-    def piece_locked(self, nb_lines, t_spin):
-        self.strings = []
-        
-        if t_spin:
-            self.strings.append(t_spin)
-        if nb_lines:
-            self.strings.append(self.SCORES[nb_lines]["name"])
-            self.combo += 1
-        else:
-            self.combo = -1
-            
-        if nb_lines or t_spin:
-            self.lines_cleared += nb_lines
-            ds = self.SCORES[nb_lines][t_spin]
-            self.goal -= ds
-            ds *= 100 * self.level
-            self.score += ds
-            self.strings.append(str(ds))
-            
-        if self.combo >= 1:
-            self.strings.append("COMBO x%d" % self.combo)
-            ds = (20 if nb_lines==1 else 50) * self.combo * self.level
-            self.score += ds
-            self.strings.append(str(ds))
-            
-        if nb_lines == 4 or (nb_lines and t_spin):
-            curses.beep()
-        if self.score > self.high_score:
-            self.high_score = self.score
-        if self.goal <= 0:
-            self.new_level()
-        else:
-            self.refresh()
+        self.window.addstr(4, 2, "TIME\t%s" % format_time(self.game.engine.time))
+        self.compositor.mark(self.window)
 
     def save(self):
-        if not os.path.exists(self.DIR_PATH):
-            os.makedirs(self.DIR_PATH)
+        # Bot games would crowd the leaderboard out
+        if not self.game.bot:
+            self.record(self.game.engine)
+
+    @classmethod
+    def record(cls, game):
+        if not game.stats.score:
+            return
+        import getpass
         try:
-            with open(self.FILE_PATH, mode='w') as f:
-                f.write(str(self.high_score))
+            cls.leaderboard().record(
+                getpass.getuser(),
+                game.stats.score,
+                game.stats.lines_cleared,
+                game.stats.level,
+                int(game.time)
+            )
         except Exception as e:
-            print("High score could not be saved:")
+            print("Score could not be saved:")
             print(e)
 
 
-class ControlsParser(ConfigParser):
+class ControlsParser:
     FILE_NAME = "config.cfg"
     if sys.platform == "win32":
         DIR_PATH = os.environ.get("appdata", os.path.expanduser(r"~\Appdata\Roaming"))
+        CACHE_DIR_PATH = os.environ.get("localappdata", DIR_PATH)
     else:
         DIR_PATH = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
+        CACHE_DIR_PATH = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
     DIR_PATH = os.path.join(DIR_PATH, DIR_NAME)
     FILE_PATH = os.path.join(DIR_PATH, FILE_NAME)
+    CACHE_DIR_PATH = os.path.join(CACHE_DIR_PATH, DIR_NAME)
+    CACHE_PATH = os.path.join(CACHE_DIR_PATH, "controls.cache")
     SECTION = "CONTROLS"
+    HANDLING_SECTION = "HANDLING"
+    CACHE_VERSION = 2
     COMMENT = """# You can change key below.
 # Acceptable values are:
 # `SPACE`, `TAB`, `ENTER`,
 # printable characters (`q`, `*`...) (case sensitive),
 # curses's constants name starting with `KEY_`
 # See https://docs.python.org/3/library/curses.html?highlight=curses#constants
+#
+# In the HANDLING section, in milliseconds:
+# DAS (delayed auto shift) is the time a move key must be held to repeat,
+# ARR (auto repeat rate) the time between its repeats, 0 moving at once to
+# the wall. Held keys are told by the terminal repeating them, and a key
+# pressed again can not be told from the first repeat of a held key, so DAS
+# counts from this first repeat, after the terminal's own repeat delay.
 
 """
     DEFAULTS = {
@@ -523,22 +420,69 @@ class ControlsParser(ConfigParser):
         "PAUSE": "p",
         "QUIT": "q"
     }
+    HANDLING_DEFAULTS = {
+        "DAS": "170",
+        "ARR": "50"
+    }
 
     def __init__(self):
-        ConfigParser.__init__(self)
-        self.optionxform = str
-        self.add_section(self.SECTION)
+        try:
+            from configparser import ConfigParser
+        except ImportError: # Python2
+            from ConfigParser import SafeConfigParser as ConfigParser
+        self.parser = ConfigParser()
+        self.parser.optionxform = str
+        self.parser.add_section(self.SECTION)
         for action, key in self.DEFAULTS.items():
             self[action] = key
+        self.parser.add_section(self.HANDLING_SECTION)
+        for name, value in self.HANDLING_DEFAULTS.items():
+            self.parser.set(self.HANDLING_SECTION, name, value)
 
         if not os.path.exists(self.FILE_PATH):
             self.reset()
 
     def __getitem__(self, key):
-        return self.get(self.SECTION, key)
+        return self.parser.get(self.SECTION, key)
 
     def __setitem__(self, key, value):
-        self.set(self.SECTION, key, value)
+        self.parser.set(self.SECTION, key, value)
+
+    def sections(self):
+        """(name, value) pairs of each section of the configuration file"""
+        self.parser.read(self.FILE_PATH)
+        return dict(
+            (section, self.parser.items(section))
+            for section in (self.SECTION, self.HANDLING_SECTION)
+        )
+
+    @classmethod
+    def load(cls):
+        """sections(), cached in a compiled form while the configuration file is unchanged"""
+        try:
+            with open(cls.CACHE_PATH, "rb") as f:
+                version, signature, sections = marshal.load(f)
+            if version == cls.CACHE_VERSION and signature == cls.signature():
+                return sections
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        sections = cls().sections()
+        try:
+            signature = cls.signature()
+            if not os.path.exists(cls.CACHE_DIR_PATH):
+                os.makedirs(cls.CACHE_DIR_PATH)
+            temp_path = "%s.%d" % (cls.CACHE_PATH, os.getpid())
+            with open(temp_path, "wb") as f:
+                marshal.dump((cls.CACHE_VERSION, signature, sections), f)
+            os.replace(temp_path, cls.CACHE_PATH)
+        except OSError:
+            pass
+        return sections
+
+    @classmethod
+    def signature(cls):
+        stat = os.stat(cls.FILE_PATH)
+        return (stat.st_mtime_ns, stat.st_size)
 
     def reset(self):
         if not os.path.exists(self.DIR_PATH):
@@ -546,12 +490,13 @@ class ControlsParser(ConfigParser):
         try:
             with open(self.FILE_PATH, 'w') as f:
                 f.write(self.COMMENT)
-                self.write(f)
+                self.parser.write(f)
         except Exception as e:
             print("Configuration could not be saved:")
             print(e)
 
     def edit(self):
+        import subprocess
         if sys.platform == "win32":
             try:
                 subprocess.call(["edit.com", self.FILE_PATH])
@@ -561,63 +506,89 @@ class ControlsParser(ConfigParser):
             os.system("${EDITOR:-nano}"+" "+self.FILE_PATH)
 
 
-class ControlsWindow(Window, ControlsParser):
+class ControlsWindow(Window):
     TITLE = "CONTROLS"
+    KEYS = {
+        "SPACE": " ",
+        "ENTER": "\n",
+        "TAB": "\t"
+    }
+
+    def __init__(self, compositor, width, height, begin_x, begin_y):
+        sections = ControlsParser.load()
+        self.items = sections[ControlsParser.SECTION]
+        self.keys = dict((action, self.KEYS.get(key, key)) for action, key in self.items)
+        # Handling delays, in seconds
+        self.handling = {}
+        values = dict(sections[ControlsParser.HANDLING_SECTION])
+        for name, default in ControlsParser.HANDLING_DEFAULTS.items():
+            try:
+                self.handling[name] = max(0, float(values.get(name, default))) / 1000
+            except ValueError:
+                self.handling[name] = float(default) / 1000
+        Window.__init__(self, compositor, width, height, begin_x, begin_y)
 
-    def __init__(self, width, height, begin_x, begin_y):
-        ControlsParser.__init__(self)
-        self.read(self.FILE_PATH)
-        Window.__init__(self, width, height, begin_x, begin_y)
-        for action, key in self.items(self.SECTION):
-            if key == "SPACE":
-                self[action] = " "
-            elif key == "ENTER":
-                self[action] = "\n"
-            elif key == "TAB":
-                self[action] = "\t"
+    def __getitem__(self, action):
+        return self.keys[action]
 
     def refresh(self):
         self.draw_border()
-        for y, (action, key) in enumerate(self.items("CONTROLS"), start=2):
+        for y, (action, key) in enumerate(self.items, start=2):
             key = key.replace("KEY_", "").upper()
             self.window.addstr(y, 2, "%s\t%s" % (key, action.upper()))
-        self.window.refresh()
-
-
-class Music:
-    PATH = os.path.join(os.path.dirname(__file__), "music.sh")
-
-    def __init__(self):
-        self.process = None
-
-    def play(self):
-        self.process = subprocess.Popen(["sh", self.PATH])
-
-    def stop(self):
-        if self.process:
-            for proc in psutil.Process(self.process.pid).children(recursive=True):
-                proc.terminate()
-            self.process.terminate()
-            self.process = None
+        self.compositor.mark(self.window)
 
 
 class Game:
     WIDTH = 80
     HEIGHT = Matrix.HEIGHT
-    AUTOREPEAT_DELAY = 0.02
-    TETROMINOES = (O, I, T, L, J, S, Z)
+    AUTOPLAY_DELAY = 0.1
+    # Highest start level, where the lock delay is down to a tenth of a second
+    MAX_LEVEL = 30
+    SHIFTS = ("MOVE LEFT", "MOVE RIGHT")
+    # Gap between the keys the terminal repeats while a key is held, past
+    # which the key is released, and pressed anew
+    AUTOREPEAT_GAP = 0.06
+    # Directory of the snapshots of suspended games, one per game
+    SNAPSHOT_DIR_PATH = Stats.DIR_PATH
+    # Wall time between snapshots protecting the game from crashes
+    SNAPSHOT_DELAY = 10
+    # Time to find a hint, leaving to the frame drawing it the rest of a
+    # 60 Hz frame, and time to solve with --solve
+    HINT_BUDGET = 0.01
+    SOLVE_BUDGET = 5
+    EVENT_LOG_PATH = os.path.join(Stats.DIR_PATH, "events.jsonl")
+    # Longest wait before accepting new viewers of --broadcast
+    BROADCAST_POLL_DELAY = 0.5
+    # Default frame rate cap of --low-bandwidth
+    LOW_BANDWIDTH_FPS = 10
+    # Lateness past which a wake up is considered a stall, whose duration
+    # is not played, so that gravity does not catch up in a burst
+    MAX_LATENESS = 0.25
+    COLORS = {
+        engine.O: curses.COLOR_YELLOW,
+        engine.I: curses.COLOR_CYAN,
+        engine.T: curses.COLOR_MAGENTA,
+        engine.L: curses.COLOR_ORANGE,
+        engine.J: curses.COLOR_BLUE,
+        engine.S: curses.COLOR_GREEN,
+        engine.Z: curses.COLOR_RED
+    }
 
     def __init__(self, scr):
+        startup_times.append(("curses", time.perf_counter()))
+        self.low_bandwidth = parse_low_bandwidth()
+        self.color_pairs = dict.fromkeys(self.COLORS, curses.COLOR_BLACK)
         if curses.has_colors():
             curses.start_color()
             if curses.can_change_color():
                 curses.init_color(curses.COLOR_YELLOW, 1000, 500, 0)
-            for tetromino_class in self.TETROMINOES: 
-                curses.init_pair(tetromino_class.COLOR, tetromino_class.COLOR, curses.COLOR_WHITE)
-                if tetromino_class.COLOR == curses.COLOR_ORANGE:
-                    tetromino_class.color_pair = curses.color_pair(curses.COLOR_YELLOW)
+            for tetromino_class, color in self.COLORS.items():
+                curses.init_pair(color, color, curses.COLOR_WHITE)
+                if color == curses.COLOR_ORANGE:
+                    self.color_pairs[tetromino_class] = curses.color_pair(curses.COLOR_YELLOW)
                 else:
-                    tetromino_class.color_pair = curses.color_pair(tetromino_class.COLOR)|curses.A_BOLD
+                    self.color_pairs[tetromino_class] = curses.color_pair(color)|curses.A_BOLD
         try:
             curses.curs_set(0)
         except curses.error:
@@ -626,6 +597,51 @@ class Game:
         scr.getch()
         self.scr = scr
 
+        # Set once the game is drawn, with --autoplay
+        self.bot = None
+        record_path = parse_option("--record")
+        resume = "--resume" in sys.argv[1:]
+        if not resume:
+            # Before the high score is loaded, which they may beat
+            self.discard_snapshots()
+            # The slot of a new game is taken when it is first saved
+            self.slot = None
+        if resume:
+            if record_path:
+                sys.exit("A resumed game can not be recorded.")
+            from . import snapshot
+            suspended = snapshot.take(self.SNAPSHOT_DIR_PATH)
+            if suspended is None:
+                sys.exit("No game to resume")
+            self.slot, self.engine = suspended
+            self.engine.stats.high_score = max(self.engine.stats.high_score, Stats.load_high_score())
+            self.recorder = None
+            self.step = self.engine.step
+        elif record_path:
+            from . import replay
+            self.recorder = replay.Recorder(open(record_path, "wb"), parse_level(), high_score=Stats.load_high_score())
+            self.engine = self.recorder.engine
+            self.step = self.recorder.step
+        else:
+            self.recorder = None
+            self.engine = engine.Engine(level=parse_level(), high_score=Stats.load_high_score())
+            self.step = self.engine.step
+        event_log_path = parse_event_log()
+        if event_log_path:
+            import getpass
+            from . import eventlog
+            try:
+                self.event_log = eventlog.EventLog(event_log_path)
+            except OSError as e:
+                sys.exit("Could not log events into %s: %s" % (event_log_path, e))
+            self.event_log.observe(
+                self.engine, "resume" if resume else "start",
+                user=getpass.getuser(), level=self.engine.stats.level
+            )
+        else:
+            self.event_log = None
+        self.scheduler = engine.Scheduler(time.monotonic, time.sleep)
+
         left_x = (curses.COLS-self.WIDTH) // 2
         top_y = (curses.LINES-self.HEIGHT) // 2
         side_width = (self.WIDTH - Matrix.WIDTH) // 2 - 1
@@ -633,132 +649,466 @@ class Game:
         right_x = left_x + Matrix.WIDTH + side_width + 2
         bottom_y = top_y + Hold.HEIGHT
 
+        if self.low_bandwidth:
+            self.blink = 0
+            self.compositor = Compositor(self.low_bandwidth, count_bytes=True)
+        else:
+            self.blink = curses.A_BLINK
+            self.compositor = Compositor()
+        if "--hints" in sys.argv[1:]:
+            from . import solver
+            self.solver = solver.Solver()
+            self.find_hint()
+        else:
+            self.solver = None
+            self.hint = None
         self.matrix = Matrix(self, left_x, top_y)
-        self.hold = Hold(side_width, left_x, top_y)
-        self.next = Next(side_width, right_x, top_y)
+        self.hold = Hold(self, side_width, left_x, top_y)
+        self.next = Next(self, side_width, right_x, top_y)
         self.stats = Stats(self, side_width, side_height, left_x, bottom_y)
-        self.controls = ControlsWindow(side_width, side_height, right_x, bottom_y)
-        self.music = Music()
-
-        self.actions = {
-            self.controls["QUIT"]: self.quit,
-            self.controls["PAUSE"]: self.pause,
-            self.controls["HOLD"]: self.swap,
-            self.controls["MOVE LEFT"]: lambda: self.matrix.piece.move(Movement.LEFT),
-            self.controls["MOVE RIGHT"]: lambda: self.matrix.piece.move(Movement.RIGHT),
-            self.controls["SOFT DROP"]: lambda: self.matrix.piece.soft_drop(),
-            self.controls["ROTATE COUNTER"]: lambda: self.matrix.piece.rotate(Rotation.COUNTERCLOCKWISE),
-            self.controls["ROTATE CLOCKWISE"]: lambda: self.matrix.piece.rotate(Rotation.CLOCKWISE),
-            self.controls["HARD DROP"]: lambda: self.matrix.piece.hard_drop()
-        }
-
-        self.paused = False
-        self.random_bag = []
-        self.next.piece = self.random_piece()
-        self.new_piece()
-        scheduler.repeat("time", 1, self.stats.refresh_time)
-        scheduler.repeat("input", self.AUTOREPEAT_DELAY, self.process_input)
-        self.music.play()
+        self.controls = ControlsWindow(self.compositor, side_width, side_height, right_x, bottom_y)
+        startup_times.append(("windows", time.perf_counter()))
+        self.music = music.Music(self.scheduler)
+
+        self.actions = dict(
+            (self.controls[action], action)
+            for action in engine.Engine.ACTIONS
+        )
+
+        self.last_step = time.monotonic()
+        self.wake_time = None
+        self.shift_action = None
+        self.shift_time = self.shift_press_time = 0
+        broadcast_address = parse_option("--broadcast")
+        if broadcast_address:
+            from . import broadcast
+            try:
+                self.broadcaster = broadcast.Broadcaster(broadcast_address)
+            except OSError as e:
+                sys.exit("Could not broadcast on %s: %s" % (broadcast_address, e))
+        else:
+            self.broadcaster = None
+        profile_path = parse_option("--profile")
+        if profile_path:
+            self.profile(profile_path)
+        else:
+            self.profiler = None
+        if resume:
+            # Give the player time to get ready
+            if self.engine.paused:
+                self.update([("pause", True)])
+            else:
+                self.play("PAUSE")
+        self.tick()
+        self.compositor.flush(force=True)
+        startup_times.append(("first frame", time.perf_counter()))
+        if "--autoplay" in sys.argv[1:]:
+            from . import bot
+            self.bot = bot.Bot()
+            self.scheduler.repeat("autoplay", self.AUTOPLAY_DELAY, self.autoplay)
+        self.scheduler.repeat("snapshot", self.SNAPSHOT_DELAY, self.take_snapshot)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.quit())
+        if not self.engine.paused:
+            self.music.play()
 
         try:
-            scheduler.run()
+            self.run()
         except KeyboardInterrupt:
             self.quit()
+        finally:
+            self.music.close()
+
+    def profile(self, path):
+        from . import profiler
+        self.profiler = profiler.Profiler()
+        self.profile_path = path
+        # (action, time its key was read) of the keys played since the last frame
+        self.inputs = []
+        for window in (self.matrix, self.hold, self.next, self.stats, self.controls):
+            self.profiler.time_method(window, "refresh", "refresh " + window.__class__.__name__)
+        self.profiler.time_method(self.stats, "refresh_time", "refresh Stats time")
+        self.profiler.time_method(self.compositor, "flush", "flush")
+        self.profiler.watch_scheduler(self.scheduler, lambda due: time.monotonic() - due)
+        # Engine jobs are due in game time, which matched wall time
+        # last_step when the current step began at step_begin
+        self.step_begin = self.engine.time
+        self.profiler.watch_scheduler(
+            self.engine.scheduler,
+            lambda due: time.monotonic() - self.last_step - (due - self.step_begin)
+        )
 
-    def random_piece(self):
-        if not self.random_bag:
-            self.random_bag = list(self.TETROMINOES)
-            random.shuffle(self.random_bag)
-        return self.random_bag.pop()(self.matrix, Next.PIECE_POSITION)
-
-    def new_piece(self):
-        scheduler.cancel("lock")
-        if not self.matrix.piece:
-            self.matrix.piece, self.next.piece = self.next.piece, self.random_piece()
-            self.next.refresh()
-        self.matrix.piece.position = Matrix.PIECE_POSITION
-        if self.matrix.piece.move(Movement.DOWN):
-            scheduler.repeat("fall", Tetromino.fall_delay, self.matrix.piece.fall)
-            self.matrix.refresh()
+    def run(self):
+        # Timers and input share a single wait: block on the keyboard until
+        # the next deadline of either the engine or the frontend scheduler.
+        # What the input and jobs of an iteration drew is sent at once.
+        while True:
+            delay = self.scheduler.run(False)
+            now = time.monotonic()
+            deadlines = [now + delay] if delay is not None else []
+            nb_frames = self.compositor.nb_frames
+            delay = self.compositor.flush()
+            if delay is not None:
+                deadlines.append(now + delay)
+            elif self.profiler and self.inputs:
+                # The keys played since the last frame are on screen
+                drawn = time.perf_counter()
+                for action, key_time in self.inputs:
+                    self.profiler.record("input " + action, drawn - key_time)
+                self.inputs = []
+            if self.broadcaster:
+                # Viewers get the frames the player gets, and are
+                # accepted even while nothing is drawn
+                if self.compositor.nb_frames != nb_frames:
+                    self.broadcaster.send(self.engine)
+                else:
+                    self.broadcaster.poll(self.engine)
+                deadlines.append(now + self.BROADCAST_POLL_DELAY)
+            delay = self.engine.next_event_delay()
+            if delay is not None:
+                deadlines.append(self.last_step + delay)
+            if deadlines:
+                self.wake_time = min(deadlines)
+                self.scr.timeout(int(math.ceil(max(0, self.wake_time - now) * 1000)))
+            else:
+                self.wake_time = None
+                self.scr.timeout(-1)
+            keys = []
+            try:
+                keys.append(self.scr.getkey())
+                # Apply all the keys pending, in order, before drawing
+                self.scr.timeout(0)
+                while True:
+                    keys.append(self.scr.getkey())
+            except curses.error:
+                pass
+            if keys:
+                now = time.monotonic()
+                self.key_time = time.perf_counter()
+                for key in keys:
+                    self.process_input(key, now)
+            else:
+                self.play(None)
+
+    def process_input(self, key, now):
+        if key == self.controls["QUIT"]:
+            self.quit()
+        action = self.actions.get(key)
+        if action in self.SHIFTS:
+            action = self.shift(action, now)
+        elif action:
+            self.shift_action = None
+            self.scheduler.cancel("shift")
+        if self.profiler and action:
+            # Its latency is recorded once the frame showing its result is sent
+            self.inputs.append((action, self.key_time))
+        self.play(action)
+
+    def play(self, action):
+        now = time.monotonic()
+        dt = now - self.last_step
+        if self.wake_time is not None:
+            dt -= max(0, now - self.wake_time - self.MAX_LATENESS)
+            self.wake_time = None
+        if self.profiler:
+            self.step_begin = self.engine.time
+        events = self.step(action, dt)
+        self.last_step = now
+        if self.profiler and events:
+            start = time.perf_counter()
+            self.update(events)
+            self.profiler.record("frame", time.perf_counter() - start)
+        else:
+            self.update(events)
+        return events
+
+    def shift(self, action, now):
+        """Action to play for a move key read at now, the game repeating held keys itself
+
+        A key is held while the terminal repeats it, less than AUTOREPEAT_GAP
+        apart, and pressed anew after a longer gap. Once held for DAS since
+        it was pressed, the game moves the piece every ARR, ignoring the
+        terminal's repeats, until they stop. Keys read at once were queued,
+        and are all played.
+        """
+        gap = now - self.shift_time
+        self.shift_time = now
+        if action != self.shift_action or gap >= self.AUTOREPEAT_GAP:
+            self.scheduler.cancel("shift")
+            self.shift_action = action
+            self.shift_press_time = now
+            return action
+        if "shift" in self.scheduler:
+            return None
+        if gap > 0:
+            if now - self.shift_press_time >= self.controls.handling["DAS"]:
+                self.scheduler.repeat("shift", self.controls.handling["ARR"] or self.AUTOREPEAT_GAP/2, self.auto_shift)
+                self.auto_shift()
+            return None
+        return action
+
+    def auto_shift(self):
+        if (
+            time.monotonic() - self.shift_time > self.AUTOREPEAT_GAP
+            or self.engine.paused
+            or self.engine.game_over
+        ):
+            self.scheduler.cancel("shift")
+        elif self.controls.handling["ARR"]:
+            self.play(self.shift_action)
         else:
+            while ("move",) in self.play(self.shift_action):
+                pass
+
+    def tick(self):
+        """Refresh the time display, then again when the game clock reaches its next second"""
+        self.play(None)
+        self.stats.refresh_time()
+        if not (self.engine.paused or self.engine.game_over):
+            self.scheduler.single_shot("time", 1 - self.engine.time % 1, self.tick)
+
+    def autoplay(self):
+        # Catch up with gravity first, so that the plan starts from where the piece is,
+        # and plan before its next gravity step, when the piece falls fall_rows rows
+        self.play(None)
+        if not (self.engine.paused or self.engine.game_over):
+            deadline = time.perf_counter() + self.engine.stats.fall_period
+            for action in self.bot.plan(self.engine, deadline):
+                self.play(action)
+
+    def update(self, events):
+        if not events:
+            return
+        names = set(event[0] for event in events)
+        if names & set(("drop", "lock", "level")):
+            self.stats.refresh()
+        for event in events:
+            if event[0] == "lock":
+                nb_lines, t_spin = event[1:]
+                if nb_lines == 4 or (nb_lines and t_spin):
+                    curses.beep()
+        if "over" in names:
             self.over()
+        elif "pause" in names:
+            paused = self.engine.paused
+            self.hold.refresh(paused)
+            self.matrix.refresh(paused)
+            self.next.refresh(paused)
+            if paused:
+                self.scheduler.cancel("time")
+                self.music.stop()
+            else:
+                self.tick()
+                self.music.play()
+        else:
+            if self.solver and names & set(("new piece", "hold")):
+                self.find_hint()
+            self.matrix.refresh()
+            if "hold" in names:
+                self.hold.refresh()
+            if "new piece" in names:
+                self.next.refresh()
+
+    def find_hint(self):
+        """Show where the first piece of the best sequence the solver finds in a frame goes"""
+        solution = self.solver.solve(self.engine, self.HINT_BUDGET)
+        if solution:
+            step = solution[1][0]
+            self.hint = (step.tetromino_class, step.cells())
+        else:
+            self.hint = None
+
+    def take_snapshot(self):
+        """Save the game to be resumed, should the session end, unless a bot plays it"""
+        if not (self.bot or self.engine.paused or self.engine.game_over):
+            self.suspend()
 
-    def process_input(self):
+    def suspend(self):
+        """Save the game to be resumed, return the error if it could not be"""
+        from . import snapshot
         try:
-            action = self.actions[self.scr.getkey()]
-        except (curses.error, KeyError):
-            pass
-        else:
-            action()
-
-    def pause(self):
-        self.stats.time = time.time() - self.stats.time
-        self.paused = True
-        self.hold.refresh(paused=True)
-        self.matrix.refresh(paused=True)
-        self.next.refresh(paused=True)
-        self.scr.timeout(-1)
-        self.music.stop()
-        
-        while True:
-            key = self.scr.getkey()
-            if key == self.controls["QUIT"]:
-                self.quit()
-                break
-            elif key == self.controls["PAUSE"]:
-                break
-
-        self.scr.timeout(0)
-        self.hold.refresh()
-        self.matrix.refresh()
-        self.next.refresh()
-        self.stats.time = time.time() - self.stats.time
-        self.music.play()
-
-    def swap(self):
-        if self.matrix.piece.hold_enabled:
-            scheduler.cancel("fall")
-            scheduler.cancel("lock")
-            self.matrix.piece, self.hold.piece = self.hold.piece, self.matrix.piece
-            self.hold.piece.position = self.hold.PIECE_POSITION
-            self.hold.piece.minoes_positions = self.hold.piece.MINOES_POSITIONS
-            self.hold.piece.hold_enabled = False
-            self.hold.refresh()
-            self.new_piece()
+            if self.slot is None:
+                self.slot = snapshot.Slot.of(self.engine, self.SNAPSHOT_DIR_PATH)
+            self.slot.save(self.engine)
+        except Exception as e:
+            return e
+
+    def discard_snapshots(self):
+        """Forget the games suspended and not played by another process, recording the scores of those not over"""
+        from . import snapshot
+        for slot in snapshot.suspended(self.SNAPSHOT_DIR_PATH):
+            if not slot.acquire():
+                continue
+            try:
+                suspended = slot.load()
+            except (IOError, snapshot.SnapshotError):
+                pass
+            else:
+                if not suspended.game_over:
+                    Stats.record(suspended)
+            slot.release(remove=True)
 
     def over(self):
-        self.stats.time = time.time() - self.stats.time
+        if self.slot:
+            self.slot.release(remove=True)
         self.matrix.refresh()
         if curses.has_colors():
-            for tetromino_class in self.TETROMINOES: 
-                curses.init_pair(tetromino_class.COLOR, tetromino_class.COLOR, curses.COLOR_BLACK)
-        for y, word in enumerate((("GA", "ME") ,("OV", "ER")), start=Matrix.NB_LINES//2):
-            for x, syllable in enumerate(word, start=Matrix.NB_COLS//2-1):
-                color = self.matrix.cells[y][x]
-                if color is None:
+            for color in self.COLORS.values():
+                curses.init_pair(color, color, curses.COLOR_BLACK)
+        for y, word in enumerate((("GA", "ME") ,("OV", "ER")), start=self.engine.matrix.nb_lines//2):
+            for x, syllable in enumerate(word, start=self.engine.matrix.nb_cols//2-1):
+                tetromino_class = self.engine.matrix.cells[y][x]
+                if tetromino_class is None:
                     color = curses.COLOR_BLACK
                 else:
-                    color |= curses.A_REVERSE
+                    color = self.color_pairs[tetromino_class] | curses.A_REVERSE
                 self.matrix.window.addstr(y, x*2+1, syllable, color)
-        self.matrix.window.refresh()
+        self.compositor.mark(self.matrix.window)
+        self.compositor.flush(force=True)
+        if self.broadcaster:
+            self.broadcaster.send(self.engine)
         curses.beep()
         self.scr.timeout(-1)
         while self.scr.getkey() != self.controls["QUIT"]:
             pass
-        self.stats.time = time.time() - self.stats.time
         self.quit()
 
     def quit(self):
-        self.stats.save()
-        t = time.localtime(time.time() - self.stats.time)
-        self.music.stop()
-        sys.exit(
-            "SCORE\t{:n}\n".format(self.stats.score) +
-            "HIGH\t{:n}\n".format(self.stats.high_score) +
-            "TIME\t%02d:%02d:%02d\n" % (t.tm_hour-1, t.tm_min, t.tm_sec) +
-            "LEVEL\t%d\n" % self.stats.level +
-            "LINES\t%d" % self.stats.lines_cleared
-        )
+        reports = [summary(self.engine)]
+        if self.engine.game_over:
+            self.stats.save()
+        elif not self.bot:
+            # The score of a suspended game is recorded once it is over, or
+            # when a new game discards it
+            error = self.suspend()
+            if error:
+                self.stats.save()
+                reports.append("Game could not be suspended: %s" % error)
+            else:
+                reports.append("SUSPENDED\tterminis --resume to go on")
+            if self.event_log:
+                self.engine.observer.record("suspend")
+        if self.event_log:
+            error = self.event_log.close()
+            if error:
+                reports.append("Events could not be logged: %s" % error)
+        if self.recorder:
+            self.recorder.close()
+        if self.profiler:
+            self.profiler.write(self.profile_path)
+        if self.broadcaster:
+            self.broadcaster.close()
+        self.music.close()
+        if self.compositor.nb_bytes is not None:
+            reports.append(self.compositor.bandwidth())
+        if "--startup-timing" in sys.argv[1:]:
+            reports.append(startup_timing())
+        sys.exit("\n".join(reports))
+
+
+def parse_option(name):
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + "="):
+            return arg[len(name)+1:]
+    return None
+
+
+def parse_level():
+    level = parse_option("--level")
+    if level is None:
+        return 1
+    try:
+        level = int(level)
+    except ValueError:
+        sys.exit(HELP_MSG)
+    else:
+        return min(Game.MAX_LEVEL, max(1, level))
+
+
+def parse_low_bandwidth():
+    """Frame rate cap of --low-bandwidth[=fps], or None without the option"""
+    if "--low-bandwidth" in sys.argv[1:]:
+        return Game.LOW_BANDWIDTH_FPS
+    max_fps = parse_option("--low-bandwidth")
+    if max_fps is None:
+        return None
+    try:
+        max_fps = float(max_fps)
+    except ValueError:
+        sys.exit(HELP_MSG)
+    if max_fps <= 0:
+        sys.exit(HELP_MSG)
+    return max_fps
+
+
+def parse_event_log():
+    """Path of --event-log[=FILE], or None without the option"""
+    if "--event-log" in sys.argv[1:]:
+        return Game.EVENT_LOG_PATH
+    return parse_option("--event-log")
+
+
+def print_scores():
+    import getpass
+    nb_scores = parse_option("--scores")
+    try:
+        nb_scores = int(nb_scores) if nb_scores else 10
+    except ValueError:
+        sys.exit(HELP_MSG)
+    if nb_scores < 1:
+        sys.exit(HELP_MSG)
+    leaderboard = Stats.leaderboard()
+    index = leaderboard.index()
+    print("RANK\tSCORE\tLINES\tLEVEL\tTIME\t\tDATE\t\t\tUSER")
+    for rank, (score, lines, level, seconds, date, user) in enumerate(index["top"][:nb_scores], start=1):
+        print("%d\t{:n}\t%d\t%d\t%s\t%s\t%s".format(score) % (rank, lines, level, format_time(seconds), date, user))
+    rank = leaderboard.rank(getpass.getuser(), index)
+    if rank:
+        print("YOUR RANK\t%d of %d players" % rank)
+    print("GAMES\t%d" % index["games"])
+    if nb_scores > leaderboard.TOP_SIZE:
+        print("Only the %d best games are kept" % leaderboard.TOP_SIZE)
+
+
+def solve():
+    """Print the best sequence for the suspended game, or else for a new one"""
+    from . import solver
+    budget = parse_option("--solve")
+    try:
+        budget = float(budget) if budget else Game.SOLVE_BUDGET
+    except ValueError:
+        sys.exit(HELP_MSG)
+    from . import snapshot
+    game = None
+    for slot in snapshot.suspended(Game.SNAPSHOT_DIR_PATH):
+        try:
+            game = slot.load()
+        except (IOError, snapshot.SnapshotError):
+            continue
+        break
+    if game is None or game.game_over:
+        game = engine.Engine(level=parse_level())
+    solver.main(game, budget)
+
+
+def startup_timing():
+    """Time of each startup step, from the import of this module to the first frame"""
+    lines = []
+    last_time = START_TIME
+    for name, step_time in startup_times:
+        lines.append("%s\t%.1f ms\t(%.1f ms)" % (name.upper(), (step_time-last_time) * 1000, (step_time-START_TIME) * 1000))
+        last_time = step_time
+    return "\n".join(lines)
+
+
+def play_replay(path):
+    from . import replay
+    try:
+        with open(path, "rb") as f:
+            game = replay.replay(f)
+    except (IOError, replay.ReplayError) as e:
+        sys.exit("Replay of %s failed: %s" % (path, e))
+    print(summary(game))
 
 
 def main():
@@ -771,6 +1121,32 @@ def main():
             controls.edit()
         elif "--edit" in sys.argv[1:] or "-e" in sys.argv[1:]:
             ControlsParser().edit()
+
+        if "--scores" in sys.argv[1:] or parse_option("--scores"):
+            locale.setlocale(locale.LC_ALL, '')
+            print_scores()
+            return
+
+        if "--solve" in sys.argv[1:] or parse_option("--solve"):
+            solve()
+            return
+
+        replay_path = parse_option("--replay")
+        if replay_path:
+            play_replay(replay_path)
+            return
+
+        watch_address = parse_option("--watch")
+        if watch_address:
+            from . import broadcast
+            broadcast.watch(watch_address)
+            return
+
+        address = parse_option("--serve")
+        if address:
+            from . import server
+            server.main(address, parse_level(), parse_event_log())
+            return
             
         locale.setlocale(locale.LC_ALL, '')
         if locale.getpreferredencoding() == 'UTF-8':
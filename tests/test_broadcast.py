@@ -0,0 +1,45 @@
+from terminis import broadcast
+from terminis.engine import Engine
+
+
+def delta(cells, previous):
+    return [(i, code) for i, (code, last) in enumerate(zip(cells, previous)) if code != last]
+
+
+def messages(engine):
+    """Snapshot of engine, then a delta after each of a few actions, with the state each leads to"""
+    cells, fields = broadcast.view(engine)
+    yield broadcast.encode(broadcast.SNAPSHOT, cells, fields), (cells, fields)
+    for action in ("MOVE LEFT", "ROTATE CLOCKWISE", "HARD DROP", "HOLD", "SOFT DROP"):
+        engine.step(action, 0.1)
+        next_cells, next_fields = broadcast.view(engine)
+        changed = dict((name, value) for name, value in next_fields.items() if fields.get(name) != value)
+        yield broadcast.encode(broadcast.DELTA, delta(next_cells, cells), changed), (next_cells, next_fields)
+        cells, fields = next_cells, next_fields
+
+
+def test_decoder_rebuilds_each_state():
+    decoder = broadcast.Decoder()
+    for message, (cells, fields) in messages(Engine(seed=1)):
+        assert decoder.feed(message) == 1
+        assert decoder.cells == cells
+        assert decoder.fields == fields
+
+
+def test_decoder_fed_one_byte_at_a_time():
+    decoder = broadcast.Decoder()
+    for message, (cells, fields) in messages(Engine(seed=2)):
+        nb_messages = 0
+        for i in range(len(message)):
+            nb_messages += decoder.feed(message[i:i+1])
+        assert nb_messages == 1
+        assert decoder.cells == cells
+        assert decoder.fields == fields
+    assert decoder.buffer == b""
+
+
+def test_decoder_fed_all_messages_at_once():
+    decoder = broadcast.Decoder()
+    stream = list(messages(Engine(seed=3)))
+    assert decoder.feed(b"".join(message for message, state in stream)) == len(stream)
+    assert (decoder.cells, decoder.fields) == stream[-1][1]
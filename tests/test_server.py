@@ -0,0 +1,60 @@
+import asyncio
+
+from terminis import server
+
+
+async def play(port, keys):
+    """Everything the server sends to a client typing keys, then quitting"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    received = await reader.readexactly(len(server.NEGOTIATION))
+    for key in keys:
+        writer.write(key)
+        await writer.drain()
+        # Wait for the frame showing the key
+        received += await reader.read(65536)
+    writer.write(b"q")
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        received += data
+    writer.close()
+    return received
+
+
+async def serve(*clients):
+    """What each client received, and the server, once they all quit"""
+    terminis_server = server.Server()
+    listener = await asyncio.start_server(terminis_server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        received = await asyncio.gather(*(play(port, keys) for keys in clients))
+    return received, terminis_server
+
+
+def score(received):
+    """Score of the summary printed on quitting, without the digit grouping of the locale"""
+    line = received.rpartition(b"SCORE\t")[2].split(b"\r\n")[0]
+    return int(bytes(byte for byte in line if chr(byte).isdigit()))
+
+
+def test_session_negotiates_draws_and_quits():
+    (received,), terminis_server = asyncio.run(serve([b" "]))
+    assert received.startswith(server.NEGOTIATION)
+    assert b"SCORE" in received and b"CONTROLS" in received
+    assert score(received) > 0
+    assert not terminis_server.sessions
+
+
+def test_keys_split_across_reads():
+    # Left arrow in two parts, then a telnet command, then a hard drop
+    (received,), terminis_server = asyncio.run(serve([
+        b"\x1b[", b"D", bytes((server.IAC, server.DO, server.ECHO)), b" "
+    ]))
+    assert score(received) > 0
+
+
+def test_sessions_share_the_high_score():
+    (first, second), terminis_server = asyncio.run(serve([b" "], [b" ", b" ", b" "]))
+    assert terminis_server.high_score == max(score(first), score(second))
+    assert score(second) > score(first)
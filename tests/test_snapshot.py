@@ -0,0 +1,78 @@
+import pytest
+
+from terminis import snapshot
+from terminis.bot import Bot
+from terminis.engine import Engine
+
+
+def state(engine):
+    """What a player sees of engine, and what decides its course"""
+    matrix = engine.matrix
+    stats = engine.stats
+    return (
+        engine.time, engine.paused, engine.game_over, engine.random.getstate(), engine.random_bag,
+        matrix.cells, matrix.lines, matrix.heights,
+        matrix.piece.__class__, matrix.piece.position.x, matrix.piece.position.y, matrix.piece.orientation,
+        engine.hold_piece.__class__, engine.next_piece.__class__,
+        stats.score, stats.level, stats.goal, stats.lines_cleared, stats.combo,
+        stats.fall_delay, stats.lock_delay
+    )
+
+
+def play(engine, nb_pieces, bot):
+    """Events of nb_pieces played by bot, with some gravity and lock delay between actions"""
+    events = []
+    for i in range(nb_pieces):
+        if engine.game_over:
+            break
+        events += engine.step(None, 0.4)
+        for action in bot.plan(engine):
+            events += engine.step(action, 0.07)
+    return events
+
+
+def test_restored_game_goes_on_the_same():
+    engine = Engine(level=5, seed=1)
+    bot = Bot()
+    play(engine, 40, bot)
+    # Stop while the piece falls, between two gravity steps
+    engine.step("MOVE LEFT", 0.13)
+    restored = snapshot.loads(snapshot.dumps(engine))
+    assert state(restored) == state(engine)
+    assert play(restored, 60, bot) == play(engine, 60, bot)
+    assert state(restored) == state(engine)
+
+
+def test_paused_game_stays_paused():
+    engine = Engine(seed=2)
+    engine.step("HARD DROP", 0.5)
+    engine.step("PAUSE", 0.2)
+    restored = snapshot.loads(snapshot.dumps(engine))
+    assert restored.paused
+    assert restored.step(None, 10) == []
+    assert restored.time == engine.time
+
+
+def test_invalid_snapshots_are_rejected():
+    data = snapshot.dumps(Engine(seed=3))
+    for invalid in (b"", data[:snapshot.HEADER.size], data[:len(data)//2], b"TRMS" + data[4:]):
+        with pytest.raises(snapshot.SnapshotError):
+            snapshot.loads(invalid)
+
+
+def test_slot_is_owned_by_one_game(tmp_path):
+    engine = Engine(seed=4)
+    engine.step("HARD DROP", 0.5)
+    slot = snapshot.Slot.of(engine, str(tmp_path))
+    slot.save(engine)
+    # Suspended games are only taken once their game released them
+    assert snapshot.take(str(tmp_path)) is None
+    other = snapshot.Slot(slot.path)
+    assert not other.acquire()
+    slot.release()
+    taken_slot, taken = snapshot.take(str(tmp_path))
+    assert taken_slot.path == slot.path
+    assert state(taken) == state(engine)
+    taken_slot.release(remove=True)
+    assert snapshot.suspended(str(tmp_path)) == []
+    assert snapshot.take(str(tmp_path)) is None